@@ -4,3 +4,8 @@ register(
     id='BubbleShooter-v0',
     entry_point='gym_bubbleshooter.envs:BubbleShooterEnv'
 )
+
+register(
+    id='BubbleShooterVec-v0',
+    entry_point='gym_bubbleshooter.envs:BubbleShooterVecEnv'
+)
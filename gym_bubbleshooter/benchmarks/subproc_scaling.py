@@ -0,0 +1,55 @@
+"""
+Measures how the throughput of BubbleShooterSubprocVecEnv scales
+from one worker process to all available cores.
+
+Usage: python -m gym_bubbleshooter.benchmarks.subproc_scaling [--envs-per-worker K] [--seconds S]
+"""
+import argparse
+import os
+import time
+import numpy as np
+from gym_bubbleshooter.envs import BubbleShooterSubprocVecEnv
+
+
+def measure(workers, envs_per_worker, seconds, seed=0):
+    """
+    Returns the steps per second of all environments together.
+    """
+    env = BubbleShooterSubprocVecEnv(num_envs=workers * envs_per_worker,
+                                     envs_per_worker=envs_per_worker, seed=seed)
+    rng = np.random.default_rng(seed)
+    try:
+        env.reset()
+        steps = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            env.step(rng.integers(0, 179, env.num_envs))
+            steps += env.num_envs
+        return steps / (time.perf_counter() - start)
+    finally:
+        env.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Measures how BubbleShooterSubprocVecEnv scales with the number of workers.")
+    parser.add_argument("--envs-per-worker", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args(argv)
+
+    cores = os.cpu_count() or 1
+    workers = 1
+    single = None
+    print("workers  steps/sec  speedup")
+    while True:
+        rate = measure(workers, args.envs_per_worker, args.seconds)
+        if single is None:
+            single = rate
+        print("{:7d}  {:9.0f}  {:7.2f}".format(workers, rate, rate / single))
+        if workers == cores:
+            break
+        workers = min(workers * 2, cores)
+
+
+if __name__ == "__main__":
+    main()
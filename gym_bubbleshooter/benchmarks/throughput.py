@@ -0,0 +1,226 @@
+"""
+Measures the throughput of the environments under a fixed seed and a
+fixed sequence of actions, so the results can be compared between commits.
+
+The single environment is measured in steps and resets per second and
+its step time is broken down into the phases of a step. The vectorized
+and the multiprocess environments are measured in steps and resets per
+second of all boards together.
+
+Usage: bubbleshooter-benchmark [--modes single vectorized multiprocess]
+                               [--output results.json]
+                               [--baseline baseline.json] [--threshold 0.1]
+
+With a baseline, the command fails if any rate dropped by more than
+the threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import numpy as np
+from gym_bubbleshooter.envs import (BubbleShooterEnv, BubbleShooterSubprocVecEnv,
+                                    BubbleShooterVecEnv)
+
+MODES = ("single", "vectorized", "multiprocess")
+
+PHASES = ("trajectory", "snapping", "neighborhood", "floaters", "observation", "terminal")
+
+
+def actions(count, num_envs=None, seed=0):
+    """
+    Returns the fixed sequence of actions, of shape (count,)
+    or (count, num_envs).
+    """
+    shape = (count,) if num_envs is None else (count, num_envs)
+    return np.random.default_rng(seed).integers(0, 179, shape)
+
+
+def best_rate(function, repeat):
+    """
+    Returns the highest rate returned by repeated calls of function,
+    which returns a count and the seconds it took.
+    """
+    rates = []
+    for _ in range(repeat):
+        count, seconds = function()
+        rates.append(count / seconds)
+    return max(rates)
+
+
+def measure_single(steps, resets, repeat, seed=0):
+    env = BubbleShooterEnv(seed=seed)
+    sequence = actions(steps, seed=seed).tolist()
+
+    def run_steps():
+        env.reset()
+        start = time.perf_counter()
+        for action in sequence:
+            if env.step(action)[2]:
+                env.reset()
+        return steps, time.perf_counter() - start
+
+    def run_resets():
+        start = time.perf_counter()
+        for _ in range(resets):
+            env.reset()
+        return resets, time.perf_counter() - start
+
+    result = {"steps_per_sec": best_rate(run_steps, repeat),
+              "resets_per_sec": best_rate(run_resets, repeat)}
+
+    # the phases are timed in a separate run, that is slowed down by the timers
+    env = BubbleShooterEnv(seed=seed, instrument=True)
+    for action in sequence:
+        if env.step(action)[2]:
+            env.reset()
+    histograms = env.instrumentation.export()
+    phases = {phase: histograms[phase + "_ns"]["mean"] for phase in PHASES}
+    phases["other"] = histograms["step_ns"]["mean"] - sum(phases.values())
+    result["phase_ns_per_step"] = phases
+    return result
+
+
+def measure_vectorized(steps, resets, repeat, num_envs, seed=0):
+    env = BubbleShooterVecEnv(num_envs=num_envs, seed=seed)
+    sequence = actions(steps, num_envs, seed)
+
+    def run_steps():
+        env.reset()
+        start = time.perf_counter()
+        for step_actions in sequence:
+            env.step(step_actions)
+        return steps * num_envs, time.perf_counter() - start
+
+    def run_resets():
+        start = time.perf_counter()
+        for _ in range(resets):
+            env.reset()
+        return resets * num_envs, time.perf_counter() - start
+
+    return {"num_envs": num_envs,
+            "steps_per_sec": best_rate(run_steps, repeat),
+            "resets_per_sec": best_rate(run_resets, repeat)}
+
+
+def measure_multiprocess(steps, resets, repeat, workers, envs_per_worker, seed=0):
+    num_envs = workers * envs_per_worker
+    env = BubbleShooterSubprocVecEnv(num_envs=num_envs, envs_per_worker=envs_per_worker,
+                                     seed=seed)
+    sequence = actions(steps, num_envs, seed)
+    try:
+        def run_steps():
+            env.reset()
+            start = time.perf_counter()
+            for step_actions in sequence:
+                env.step(step_actions)
+            return steps * num_envs, time.perf_counter() - start
+
+        def run_resets():
+            start = time.perf_counter()
+            for _ in range(resets):
+                env.reset()
+            return resets * num_envs, time.perf_counter() - start
+
+        return {"workers": workers,
+                "envs_per_worker": envs_per_worker,
+                "steps_per_sec": best_rate(run_steps, repeat),
+                "resets_per_sec": best_rate(run_resets, repeat)}
+    finally:
+        env.close()
+
+
+def run(modes=MODES, steps=2000, resets=200, repeat=3, num_envs=64,
+        workers=None, envs_per_worker=8, seed=0):
+    """
+    Runs the benchmarks of the given modes and returns the results
+    as a JSON serializable dictionary.
+    """
+    workers = workers or os.cpu_count() or 1
+    results = {}
+    for mode in modes:
+        if mode == "single":
+            results[mode] = measure_single(steps, resets, repeat, seed)
+        elif mode == "vectorized":
+            results[mode] = measure_vectorized(
+                max(1, steps // num_envs), max(1, resets // num_envs), repeat, num_envs, seed)
+        elif mode == "multiprocess":
+            boards = workers * envs_per_worker
+            results[mode] = measure_multiprocess(
+                max(1, steps // boards), max(1, resets // boards), repeat,
+                workers, envs_per_worker, seed)
+        else:
+            raise ValueError("Unknown benchmark mode: {}".format(mode))
+    return {"config": {"steps": steps, "resets": resets, "repeat": repeat, "seed": seed},
+            "system": {"python": platform.python_version(),
+                       "numpy": np.__version__,
+                       "platform": platform.platform(),
+                       "cpus": os.cpu_count()},
+            "results": results}
+
+
+def regressions(results, baseline, threshold):
+    """
+    Returns a message for every rate in the results that is lower than
+    the same rate in the baseline by more than the threshold.
+    """
+    messages = []
+    for mode, rates in baseline["results"].items():
+        for name, rate in rates.items():
+            if not name.endswith("_per_sec") or mode not in results["results"]:
+                continue
+            current = results["results"][mode][name]
+            if current < rate * (1 - threshold):
+                messages.append("{} {}: {:.0f} < {:.0f} ({:+.1%})".format(
+                    mode, name, current, rate, current / rate - 1))
+    return messages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Measures the throughput of the bubble shooter environments.")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--steps", type=int, default=2000,
+                        help="steps of all environments together per run")
+    parser.add_argument("--resets", type=int, default=200,
+                        help="resets of all environments together per run")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="runs of which the best is reported")
+    parser.add_argument("--num-envs", type=int, default=64,
+                        help="boards of the vectorized environment")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes of the multiprocess environment, all cores by default")
+    parser.add_argument("--envs-per-worker", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="file to write the results to as JSON")
+    parser.add_argument("--baseline", help="JSON results to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative drop of a rate that counts as a regression")
+    args = parser.parse_args(argv)
+
+    results = run(args.modes, args.steps, args.resets, args.repeat, args.num_envs,
+                  args.workers, args.envs_per_worker, args.seed)
+    for mode, rates in results["results"].items():
+        print("{:12s} {:10.0f} steps/sec {:10.0f} resets/sec".format(
+            mode, rates["steps_per_sec"], rates["resets_per_sec"]))
+        for phase, nanoseconds in rates.get("phase_ns_per_step", {}).items():
+            print("  {:12s} {:8.1f} us/step".format(phase, nanoseconds / 1000))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        messages = regressions(results, baseline, args.threshold)
+        for message in messages:
+            print("Regression: " + message, file=sys.stderr)
+        if messages:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1 +1,6 @@
 from gym_bubbleshooter.envs.bubbleshooter_env import *
+from gym_bubbleshooter.envs.bubbleshooter_vec_env import BubbleShooterVecEnv
+from gym_bubbleshooter.envs.subproc_vec_env import BubbleShooterSubprocVecEnv
+from gym_bubbleshooter.envs.async_env_pool import BubbleShooterEnvPool
+from gym_bubbleshooter.envs.episode_log import EpisodeLog, EpisodeRecorder, ReplayEngine, TransitionReader
+from gym_bubbleshooter.envs.zobrist import TranspositionTable, ZobristKeys
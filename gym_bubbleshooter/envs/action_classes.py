@@ -0,0 +1,81 @@
+import numpy as np
+from gym_bubbleshooter.envs import trajectory
+
+
+class ActionClasses():
+    """
+    Groups the actions by the cell their bubble lands in.
+
+    The landing cell of every action is cached together with the cells
+    it depends on: the cells close to its trajectory and the cells closer
+    to its stop position than the cell it lands in. Only the actions that
+    depend on a cell whose occupation changed are shot again.
+    """
+
+    def __init__(self, geometry, speed, actions):
+        self.geometry = geometry
+        self.speed = speed
+        self.actions = np.arange(actions)
+        size = geometry.array_height * geometry.array_width
+        self.cells = np.zeros(actions, dtype=np.int64)
+        self.depends = np.zeros((actions, size), dtype=bool)
+        self.occupied = None
+
+    def update(self, occupied):
+        """
+        Updates the landing cells for the given boolean grid
+        of occupied cells.
+        """
+        occupied = occupied.ravel()
+        if self.occupied is None:
+            stale = self.actions
+        else:
+            changed = occupied != self.occupied
+            if not changed.any():
+                return
+            stale = np.flatnonzero(self.depends[:, changed].any(axis=1))
+        if len(stale) > 0:
+            self._shoot(stale, occupied)
+        self.occupied = occupied.copy()
+
+    def classes(self):
+        """
+        Returns for every action the smallest action
+        that lands in the same cell.
+        """
+        _, first, inverse = np.unique(self.cells, return_index=True, return_inverse=True)
+        return self.actions[first][inverse]
+
+    def _shoot(self, actions, occupied):
+        geometry = self.geometry
+        centers_x = geometry.centers_x.ravel()
+        centers_y = geometry.centers_y.ravel()
+        count = len(actions)
+        segments = []
+        x, y = trajectory.cast_batch(
+            np.full(count, geometry.start_x), np.full(count, geometry.start_y),
+            actions + 1, np.broadcast_to(occupied, (count, len(occupied))),
+            centers_x, centers_y, geometry.bubble_radius, geometry.spacing,
+            geometry.window_width, self.speed, segments)
+
+        # the landing cell and all cells that are at least as close
+        distances = np.sqrt((x[:, None] - centers_x)**2 + (y[:, None] - centers_y)**2)
+        cells = np.where(occupied, np.inf, distances).argmin(axis=1)
+        depends = distances <= distances[np.arange(count), cells][:, None] + 1e-6
+
+        # all cells close enough to the trajectory to touch the bubble
+        reach = 2 * geometry.bubble_radius + 1
+        for shots, start_x, start_y, end_x, end_y in segments:
+            dx, dy = (end_x - start_x)[:, None], (end_y - start_y)[:, None]
+            length = np.maximum(dx * dx + dy * dy, 1e-12)
+            t = np.clip(((centers_x - start_x[:, None]) * dx
+                         + (centers_y - start_y[:, None]) * dy) / length, 0, 1)
+            close = ((start_x[:, None] + t * dx - centers_x)**2
+                     + (start_y[:, None] + t * dy - centers_y)**2) <= reach**2
+            if len(np.unique(shots)) == len(shots):
+                depends[shots] |= close
+            else:
+                np.logical_or.at(depends, shots, close)
+
+        self.cells[actions] = cells
+        self.depends[actions] = depends
@@ -0,0 +1,242 @@
+import asyncio
+import collections
+import functools
+import numpy as np
+import sys
+import random
+from gym import spaces
+from gym_bubbleshooter.envs.subproc_vec_env import (
+    _WorkerGroup, _check_env_kwargs, _state_specs, _write_state)
+
+
+def _serve(offset, connection, arrays, envs):
+    """
+    Steps or resets one environment of the worker, whose first
+    environment has the id offset, on every command.
+    """
+    while True:
+        message = connection.recv()
+        if message == "close":
+            break
+        command, env_id, action = message
+        env = envs[env_id - offset]
+        if command == "step":
+            _, reward, done, _ = env.step(action)
+            arrays["rewards"][env_id] = reward
+            arrays["dones"][env_id] = done
+            if done:
+                arrays["terminal_board"][env_id] = env.grid.ravel()
+                env.reset()
+        elif command == "reset":
+            env.reset()
+            arrays["rewards"][env_id] = 0
+            arrays["dones"][env_id] = False
+        _write_state(arrays, env_id, env)
+        # every environment is reported on its own, as soon as it is done
+        connection.send(env_id)
+
+
+class BubbleShooterEnvPool():
+    """
+    Steps BubbleShooterEnvs in worker processes and hands out whichever
+    environments finished first, so a learner never waits for the slowest
+    environment of a batch.
+
+    The pool is used from a coroutine, the environments are started with
+    reset and every batch received is answered with actions for exactly
+    the environments in it:
+
+        pool.reset()
+        while training:
+            env_ids, state, rewards, dones, info = await pool.recv()
+            pool.send(policy(state), env_ids)
+
+    Like BubbleShooterSubprocVecEnv the workers write the game states into
+    shared memory, environments whose game is over are reset automatically
+    and the seed of every environment is derived from the given seed, so
+    an environment plays the same games independently of the order in
+    which the environments finish. The results of the workers are read
+    through readers on the running event loop, which requires an event
+    loop that supports add_reader, like the default loop on Unix.
+    """
+
+    def __init__(self, num_envs=8, batch_size=None, envs_per_worker=1, seed=None,
+                 context=None, env_kwargs=None):
+        """
+        Parameters
+        ----------
+        num_envs : int
+            The number of environments.
+        batch_size : int
+            The number of environments returned by recv, all by default.
+            recv waits for fewer only if fewer are stepping.
+        envs_per_worker : int
+            The number of environments stepped by every worker process,
+            which step them one after another.
+        seed : int
+            The seed from which the seeds of all environments are derived.
+        context : str
+            The multiprocessing start method, the default if None.
+        env_kwargs : dict
+            The keyword arguments of every BubbleShooterEnv,
+            like the configuration of the board. The game states are
+            always flat color grids, so observation_format and
+            observation_view are not accepted.
+        """
+        self.num_envs = num_envs
+        self.batch_size = num_envs if batch_size is None else batch_size
+        if not 1 <= self.batch_size <= num_envs:
+            raise ValueError("batch_size has to be between 1 and num_envs, not {}".format(
+                batch_size))
+        self.seed = seed
+        if seed is None:
+            self.seed = random.randint(0, sys.maxsize)
+
+        env_kwargs, prototype = _check_env_kwargs(env_kwargs)
+        size = prototype.array_height * prototype.array_width
+        colors = len(prototype.colors)
+        self.action_space = spaces.Discrete(179)
+        self.observation_space = spaces.Dict({
+            "next_bubble": spaces.Discrete(colors),
+            "board": spaces.Box(0, colors, (size,), dtype=np.uint8)})
+        self._workers = _WorkerGroup(_state_specs(num_envs, size), context)
+        self._arrays = self._workers.arrays
+        self.closed = False
+
+        # the seeds of the environments do not depend on how they are spread over the workers
+        seeds = np.random.SeedSequence(self.seed).generate_state(num_envs, np.uint64)
+        self._owners = []
+        for offset in range(0, num_envs, envs_per_worker):
+            env_seeds = seeds[offset:offset + envs_per_worker]
+            connection = self._workers.start(functools.partial(_serve, offset),
+                                             env_seeds, env_kwargs)
+            self._owners += [connection] * len(env_seeds)
+
+        # environments that are stepping or whose results were not received yet
+        self._pending = set()
+        self._ready = collections.deque()
+        self._error = None
+        self._loop = None
+        self._event = None
+
+    def reset(self, env_ids=None):
+        """
+        Starts resetting the given environments, all by default.
+        Their game states are returned by recv.
+        """
+        self._send("reset", range(self.num_envs) if env_ids is None else env_ids)
+
+    def send(self, actions, env_ids):
+        """
+        Starts stepping the given environments with the given actions
+        and returns immediately. The results are returned by recv.
+        """
+        env_ids = np.asarray(env_ids).tolist()
+        actions = np.asarray(actions).tolist()
+        if len(actions) != len(env_ids):
+            raise ValueError("Got {} actions for {} environments".format(
+                len(actions), len(env_ids)))
+        self._send("step", env_ids, actions)
+
+    async def recv(self):
+        """
+        Waits until batch_size environments are done, or all stepping
+        environments if fewer are stepping, and returns them.
+
+        Returns
+        -------
+        env_ids, ob, reward, episode_over, info : tuple
+            The ids of the environments, shape (n,), and their game states,
+            rewards and dones like BubbleShooterVecEnv.step, in the order
+            in which they finished. info holds the "terminal_board"
+            of the returned environments if any game is over.
+        """
+        if self.closed:
+            raise Exception("The pool is closed")
+        self._listen(asyncio.get_running_loop())
+        wanted = min(self.batch_size, len(self._pending))
+        if wanted == 0:
+            raise Exception("send or reset has to be called before recv")
+        while len(self._ready) < wanted and self._error is None:
+            self._event.clear()
+            await self._event.wait()
+        if self._error is not None:
+            raise self._error
+        env_ids = np.array([self._ready.popleft() for _ in range(wanted)], dtype=np.int64)
+        self._pending.difference_update(env_ids.tolist())
+        state = {"next_bubble": self._arrays["next_bubble"][env_ids],
+                 "board": self._arrays["board"][env_ids]}
+        dones = self._arrays["dones"][env_ids]
+        info = {}
+        if dones.any():
+            info["terminal_board"] = self._arrays["terminal_board"][env_ids]
+        return env_ids, state, self._arrays["rewards"][env_ids], dones, info
+
+    def close(self):
+        """
+        Stops all workers and frees the shared memory.
+        """
+        if self.closed:
+            return
+        self._unlisten()
+        try:
+            # let the workers finish the environments they are stepping
+            for env_id in self._pending.difference(self._ready):
+                if self._owners[env_id] not in self._workers.dead:
+                    self._read(self._owners[env_id])
+        finally:
+            self._arrays = None
+            self._workers.close()
+            self.closed = True
+
+    def __del__(self):
+        if not getattr(self, "closed", True):
+            self.close()
+
+    def _send(self, command, env_ids, actions=None):
+        if self.closed:
+            raise Exception("The pool is closed")
+        if self._error is not None:
+            raise self._error
+        env_ids = [int(env_id) for env_id in env_ids]
+        busy = self._pending.intersection(env_ids)
+        if busy or len(set(env_ids)) != len(env_ids):
+            raise Exception("Environments {} are already stepping".format(
+                sorted(busy) or env_ids))
+        for index, env_id in enumerate(env_ids):
+            action = None if actions is None else int(actions[index])
+            self._owners[env_id].send((command, env_id, action))
+        self._pending.update(env_ids)
+
+    def _listen(self, loop):
+        """
+        Reads the results of the workers on the given event loop.
+        """
+        if self._loop is loop:
+            return
+        self._unlisten()
+        self._loop = loop
+        self._event = asyncio.Event()
+        for connection in self._workers.connections:
+            if connection not in self._workers.dead:
+                loop.add_reader(connection.fileno(), self._read, connection)
+
+    def _unlisten(self):
+        if self._loop is not None and not self._loop.is_closed():
+            for connection in self._workers.connections:
+                if connection not in self._workers.dead:
+                    self._loop.remove_reader(connection.fileno())
+        self._loop = None
+
+    def _read(self, connection):
+        message = self._workers.receive(connection)
+        if isinstance(message, Exception):
+            # stop reading from the worker, it stopped
+            if self._loop is not None and not self._loop.is_closed():
+                self._loop.remove_reader(connection.fileno())
+            if self._error is None:
+                self._error = message
+        else:
+            self._ready.append(message)
+        if self._event is not None:
+            self._event.set()
@@ -0,0 +1,114 @@
+import numpy as np
+
+
+def dilate(mask):
+    """
+    Returns the given boolean boards of shape (N, height, width) grown
+    by all direct neighbors in the hexagonal grid.
+    """
+    grown = mask.copy()
+    # left and right neighbors
+    grown[:, :, 1:] |= mask[:, :, :-1]
+    grown[:, :, :-1] |= mask[:, :, 1:]
+    # neighbors in the rows above and below, which are shifted to the
+    # right in odd rows
+    adjacent = np.zeros_like(mask)
+    adjacent[:, 1:] |= mask[:, :-1]
+    adjacent[:, :-1] |= mask[:, 1:]
+    grown |= adjacent
+    grown[:, 0::2, 1:] |= adjacent[:, 0::2, :-1]
+    grown[:, 1::2, :-1] |= adjacent[:, 1::2, 1:]
+    return grown
+
+
+def flood(seed, allowed):
+    """
+    Returns all cells of the allowed cells, that are connected
+    to one of the seed cells.
+    """
+    component = seed & allowed
+    while True:
+        grown = dilate(component)
+        grown &= allowed
+        if np.array_equal(grown, component):
+            return component
+        component = grown
+
+
+def snap(x, y, occupied, centers_x, centers_y):
+    """
+    Returns the rows and columns of the empty cells closest
+    to the given positions of shape (N,) on boards of shape (N, height, width).
+    """
+    distances = np.sqrt((x[:, None, None] - centers_x)**2
+                        + (y[:, None, None] - centers_y)**2)
+    distances[occupied] = np.inf
+    flat = distances.reshape(len(x), -1).argmin(axis=1)
+    return np.divmod(flat, centers_x.shape[1])
+
+
+def pop(grids, rows, columns, empty):
+    """
+    Deletes the clusters of three or more bubbles of the same color
+    around the given cells and all bubbles that are no longer
+    connected to the top afterwards.
+
+    Returns
+    -------
+    sizes, floaters : tuple
+        sizes (numpy.ndarray) :
+            the size of the cluster around every given cell.
+        floaters (numpy.ndarray) :
+            the number of floating bubbles deleted on every board.
+    """
+    boards = np.arange(len(grids))
+    colors = grids[boards, rows, columns]
+    seed = np.zeros(grids.shape, dtype=bool)
+    seed[boards, rows, columns] = True
+    cluster = flood(seed, grids == colors[:, None, None])
+    sizes = cluster.sum(axis=(1, 2))
+
+    floaters = np.zeros(len(grids), dtype=np.int64)
+    popped = np.flatnonzero(sizes >= 3)
+    if len(popped) > 0:
+        subset = grids[popped]
+        subset[cluster[popped]] = empty
+        occupied = subset != empty
+        top = np.zeros_like(occupied)
+        top[:, 0] = occupied[:, 0]
+        floating = occupied & ~flood(top, occupied)
+        subset[floating] = empty
+        floaters[popped] = floating.sum(axis=(1, 2))
+        grids[popped] = subset
+    return sizes, floaters
+
+
+def outcome(grids, sizes, death_line, empty, rewards):
+    """
+    Returns the rewards and whether the game is over on all boards,
+    like BubbleShooterEnv._is_over and BubbleShooterEnv._get_reward.
+    """
+    occupied = grids != empty
+    lost = occupied[:, death_line:].any(axis=(1, 2))
+    won = ~occupied.any(axis=(1, 2))
+    result = np.where(sizes == 1, rewards["miss"], rewards["hit"])
+    result = np.where(sizes >= 3, sizes * rewards["pop"], result)
+    result[won] = rewards["win"]
+    result[lost] = rewards["lost"]
+    return result, lost | won
+
+
+def random_colors(grids, colors, random_generator):
+    """
+    Returns a random color index for every board, of the colors that
+    are left on it, or of all colors if the board is empty, like
+    BubbleShooterEnv draws its next bubble.
+    """
+    boards = len(grids)
+    # the last column counts the empty cells
+    present = np.zeros((boards, colors + 1), dtype=bool)
+    present[np.arange(boards)[:, None], grids.reshape(boards, -1)] = True
+    present = present[:, :colors]
+    present[~present.any(axis=1)] = True
+    picks = random_generator.integers(0, present.sum(axis=1))
+    return (present.cumsum(axis=1) <= picks[:, None]).sum(axis=1).astype(np.uint8)
@@ -1,10 +1,72 @@
+import functools
 import gym
 import numpy as np
 import sys
-import copy
 import random
 import math
+import struct
+import time
 from gym import spaces, error
+from gym_bubbleshooter.envs import batch, trajectory
+from gym_bubbleshooter.envs.action_classes import ActionClasses
+from gym_bubbleshooter.envs.connectivity import Connectivity
+from gym_bubbleshooter.envs.geometry import Geometry
+from gym_bubbleshooter.envs.instrumentation import Instrumentation
+from gym_bubbleshooter.envs.observation import ObservationEncoder
+from gym_bubbleshooter.envs.renderer import HumanRenderer, RgbArrayRenderer
+from gym_bubbleshooter.envs.zobrist import ZobristKeys
+
+
+@functools.lru_cache(maxsize=4096)
+def _initial_state(array_height, array_width, colors, initial_lines, seed):
+    """
+    Returns the start of the game with the given configuration and seed,
+    see _start_state.
+
+    The results are kept in a bounded cache shared by all environments,
+    so a reset with a seed that was used before only copies them.
+    """
+    random_generator = np.random.Generator(np.random.PCG64(seed))
+    grid = np.full((array_height, array_width), colors, dtype=np.uint8)
+    grid[:initial_lines] = random_generator.integers(
+        0, colors, (initial_lines, array_width), dtype=np.uint8)
+    return _start_state(grid, colors, random_generator)
+
+
+def _start_state(grid, colors, random_generator):
+    """
+    Returns the read-only color grid, the color index of the next bubble
+    drawn with the given generator, the state of the generator, the
+    number of bubbles of every color and in every row and the Zobrist
+    hash of the bubbles on the grid.
+    """
+    color_counts, row_counts = _count_bubbles(grid, colors)
+    next_color = _random_color(random_generator, color_counts)
+    board_hash = ZobristKeys.cached(*grid.shape, colors).board_hash(grid)
+    grid.flags.writeable = False
+    return (grid, next_color, random_generator.bit_generator.state,
+            tuple(color_counts), tuple(row_counts), board_hash)
+
+
+def _count_bubbles(grid, colors):
+    """
+    Returns lists with the number of bubbles of every color
+    and in every row of the color grid.
+    """
+    color_counts = np.bincount(grid.ravel(), minlength=colors + 1)[:colors].tolist()
+    row_counts = (grid != colors).sum(axis=1).tolist()
+    return color_counts, row_counts
+
+
+def _random_color(random_generator, color_counts):
+    """
+    Returns a random color index of the colors that are left on the board,
+    or of all colors if the board is empty.
+    """
+    colors = [color for color, count in enumerate(color_counts) if count]
+    if not colors:
+        return int(random_generator.integers(len(color_counts)))
+    return colors[random_generator.integers(len(colors))]
 
 
 class Bubble():
@@ -15,9 +77,87 @@ class Bubble():
         self.color = color
 
 
+class BubbleView():
+    """
+    A Bubble-like view on a single cell of the game board.
+    """
+
+    def __init__(self, env, row, column):
+        self._env = env
+        self._row = row
+        self._column = column
+
+    @property
+    def center_x(self):
+        return float(self._env.centers_x[self._row, self._column])
+
+    @property
+    def center_y(self):
+        return float(self._env.centers_y[self._row, self._column])
+
+    @property
+    def color(self):
+        index = self._env.grid[self._row, self._column]
+        if index == self._env.empty:
+            return None
+        return self._env.colors[index]
+
+    @color.setter
+    def color(self, color):
+        index = self._env.empty if color is None else self._env.color_dictionary[color]
+        self._env._set_cell(self._row * self._env.array_width + self._column, index)
+
+
+class BoardView():
+    """
+    A view on the game board, that allows to read and write the
+    color grid as a list of lists of bubbles.
+    """
+
+    def __init__(self, env):
+        self._env = env
+
+    def __len__(self):
+        return self._env.array_height
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += self._env.array_height
+        if not 0 <= row < self._env.array_height:
+            raise IndexError("row index out of range")
+        return _RowView(self._env, row)
+
+    def __iter__(self):
+        for row in range(self._env.array_height):
+            yield _RowView(self._env, row)
+
+
+class _RowView():
+    def __init__(self, env, row):
+        self._env = env
+        self._row = row
+
+    def __len__(self):
+        return self._env.array_width
+
+    def __getitem__(self, column):
+        if column < 0:
+            column += self._env.array_width
+        if not 0 <= column < self._env.array_width:
+            raise IndexError("column index out of range")
+        return BubbleView(self._env, self._row, column)
+
+    def __setitem__(self, column, bubble):
+        self[column].color = bubble.color
+
+    def __iter__(self):
+        for column in range(self._env.array_width):
+            yield BubbleView(self._env, self._row, column)
+
+
 class BubbleShooterEnv(gym.Env):
-    metadata = {'render.modes': ['human', 'console'],
-                'video.frames_per_second':350}
+    metadata = {'render.modes': ['human', 'console', 'rgb_array'],
+                'video.frames_per_second': 60}
 
     gray = (100, 100, 100)
     white = (255, 255, 255)
@@ -32,120 +172,258 @@ class BubbleShooterEnv(gym.Env):
 
     colors = [red, green, blue, yellow, orange, purple, cyan]
 
-    def __init__(self, seed=None):
-        self.seed = seed
-        if seed is None:
-            self.seed = random.randint(0, sys.maxsize)
-        self.array_height = 14
-        self.array_width = 16
-        self.death_line = self.array_height - 2
-        self.initial_lines = 5
-        self.spacing = 5  # in pixel
-        self.bubble_radius = 20  # in pixel
-        self.window_height = (self.array_height * self.bubble_radius * 2
-                              + self.spacing * (self.array_height + 2)
-                              + 6 * self.bubble_radius)
-        self.window_width = (self.array_width * self.bubble_radius * 2
-                             + self.spacing * (self.array_width + 1)
-                             + self.bubble_radius + 0.5 * self.spacing)
-        self.start_x = self.window_width / 2.0
-        self.start_y = self.window_height - self.spacing - self.bubble_radius
-        self.speed = 1  # pixels, affects performance, be careful with too high values!
+    rewards = {"hit": 1,
+               "miss": -1,
+               "pop": 10,
+               "win": 200,
+               "lost": -200}
+
+    def __init__(self, seed=None, record=False, action_mask=False,
+                 observation_format="flat", observation_view=False,
+                 render_scale=1.0, render_grayscale=False, render_fps=None,
+                 render_velocity=2000, render_threaded=False, instrument=False,
+                 array_height=14, array_width=16, num_colors=7, bubble_radius=20,
+                 spacing=5, initial_lines=5, speed=1, board_pool=None):
+        """
+        Parameters
+        ----------
+        seed : int
+            The seed of the initial board and the random number generator
+            of the environment, random if None, see seed.
+        record : bool
+            Whether step records what is needed to animate it in render.
+            This is switched on by the first call of render.
+        action_mask : bool
+            Whether step returns the mask of get_action_mask
+            as "action_mask" in info.
+        observation_format : str
+            The format of the board in the game state,
+            "flat", "grid" or "onehot", see ObservationEncoder.
+        observation_view : bool
+            Whether the game state is returned as a view on a buffer that
+            is overwritten by the next step, instead of a copy.
+        render_scale : float
+            The size of the frames of the rgb_array render mode
+            relative to the window.
+        render_grayscale : bool
+            Whether the rgb_array render mode returns grayscale frames
+            of shape (height, width) instead of RGB frames.
+        render_fps : int
+            The frame rate of the human render mode, by default
+            metadata["video.frames_per_second"].
+        render_velocity : float
+            The speed of the bubbles in the human render mode
+            in pixels per second.
+        render_threaded : bool
+            Whether the human render mode draws the window on a background
+            thread, so render returns without waiting for the animation.
+        instrument : bool
+            Whether step measures the work and the time in nanoseconds
+            of its phases, returns them as "stats" in info and adds them
+            to the histograms of self.instrumentation.
+        array_height, array_width : int
+            The number of rows and columns of the game board.
+        num_colors : int
+            The number of bubble colors, at most len(BubbleShooterEnv.colors).
+        bubble_radius, spacing : int
+            The radius of the bubbles and the space between them in pixel.
+        initial_lines : int
+            The number of rows filled at the start, which has to be
+            above the death line in row array_height - 2.
+        speed : int
+            The distance a bubble moves in one step in pixel.
+        board_pool : int or array_like
+            If given, reset starts from a board drawn at random from a pool
+            instead of the board of the seed. Either the number of boards
+            to generate from the seed or an array of shape
+            (boards, array_height, array_width) with the color index of
+            every cell, len(colors) for empty cells.
+        """
+        if not 1 <= num_colors <= len(self.colors):
+            raise ValueError("num_colors has to be between 1 and {}".format(len(self.colors)))
+        if not 0 < initial_lines < array_height - 2:
+            raise ValueError("initial_lines has to be between 1 and array_height - 3")
+        self.record = record
+        self.action_mask = action_mask
+        self.geometry = Geometry.cached(array_height, array_width, bubble_radius, spacing)
+        self.array_height = self.geometry.array_height
+        self.array_width = self.geometry.array_width
+        self.death_line = self.geometry.death_line
+        self.initial_lines = initial_lines
+        self.spacing = self.geometry.spacing
+        self.bubble_radius = self.geometry.bubble_radius
+        self.window_height = self.geometry.window_height
+        self.window_width = self.geometry.window_width
+        self.start_x = self.geometry.start_x
+        self.start_y = self.geometry.start_y
+        self.centers_x = self.geometry.centers_x
+        self.centers_y = self.geometry.centers_y
+        self._centers_x = self.centers_x.ravel().tolist()
+        self._centers_y = self.centers_y.ravel().tolist()
+        self.connectivity = Connectivity.cached(self.array_height, self.array_width)
+        self.speed = speed  # pixels, affects performance, be careful with too high values!
+        self.colors = self.colors[:num_colors]
         self.color_dictionary = {}
         for i in range(len(self.colors)):
             self.color_dictionary[self.colors[i]] = i
+        self.empty = len(self.colors)  # color index of an empty cell
+        self.zobrist = ZobristKeys.cached(self.array_height, self.array_width, len(self.colors))
         self.action_space = spaces.Discrete(179)
-        self.observation_space = spaces.Dict({"next_bubble": spaces.Discrete(len(self.colors)), "board": spaces.MultiDiscrete([
-                                             len(self.colors) for i in range(self.array_height * self.array_height)])})
+        self._action_classes = ActionClasses(self.geometry, self.speed, self.action_space.n)
+        self.observation_encoder = ObservationEncoder(
+            self.array_height, self.array_width, len(self.colors),
+            observation_format, observation_view)
+        self.observation_space = self.observation_encoder.space()
+        self.render_scale = render_scale
+        self.render_grayscale = render_grayscale
+        self.render_fps = render_fps or self.metadata["video.frames_per_second"]
+        self.render_velocity = render_velocity
+        self.render_threaded = render_threaded
+        self._rgb_array_renderer = None
+        self._human_renderer = None
+        self.instrumentation = Instrumentation() if instrument else None
+        self._stats = None  # the statistics of the current step
+        self.grid = self._make_blank_board()
+        self._board_pool_source = board_pool
+        self.seed(seed)
         self.reset()
 
+    def seed(self, seed=None):
+        """
+        Sets the seed of the environment, random if None, and returns it
+        in a list. Every reset starts the same game from this seed, with
+        its own random number generator, so environments never share state.
+        """
+        if seed is None:
+            seed = random.randint(0, sys.maxsize)
+        self._seed = seed
+        self.np_random = np.random.Generator(np.random.PCG64(seed))
+        self._board_pool = None
+        if self._board_pool_source is not None:
+            self._board_pool = self._make_board_pool(self._board_pool_source)
+            self._pool_random = random.Random(seed)
+        return [seed]
+
     def reset(self):
         """
         This function resets the environment and returns the game state.
         """
-        self.color_list = copy.deepcopy(self.colors)
-        random.seed(self.seed)
-        random.shuffle(self.color_list)
-        self.board = self._make_blank_board()
-        self._set_bubble_positions()
-        self._fill_board()
+        if self._board_pool is None:
+            grid, next_color, random_state, color_counts, row_counts, board_hash = _initial_state(
+                self.array_height, self.array_width, len(self.colors),
+                self.initial_lines, self._seed)
+            loose = ()
+        else:
+            grid, next_color, random_state, color_counts, row_counts, board_hash, loose = \
+                self._board_pool[self._pool_random.randrange(len(self._board_pool))]
+        np.copyto(self.grid, grid)
+        self.np_random.bit_generator.state = random_state
+        # the number of bubbles of every color and in every row
+        self._color_counts = list(color_counts)
+        self._row_counts = list(row_counts)
+        # the Zobrist hash of the bubbles on the board, see state_hash
+        self._board_hash = board_hash
+        # bubbles that are not connected to the top, see _delete_floaters,
+        # None if they have to be searched again after the grid was changed from outside
+        self._loose = set(loose)
         self.next_bubble = Bubble(
             self.start_x,
             self.start_y,
-            self.color_list[0])
+            self.colors[next_color])
 
         # for rendering
-        self.screen = None
-        self.last_board = copy.deepcopy(self.board)
-        self.last_positions = []
+        self.last_changes = []
+        self.last_path = []
         self.last_color = None
 
         return self._get_game_state()
 
+    def get_state(self):
+        """
+        Returns a snapshot of the game state as bytes, that can be
+        restored with set_state.
+
+        The snapshot holds the color grid, the next bubble and the state
+        of the random number generator of the environment.
+        """
+        rng = self.np_random.bit_generator.state
+        return b"".join((
+            struct.pack("<B", self.color_dictionary[self.next_bubble.color]),
+            rng["state"]["state"].to_bytes(16, "little"),
+            rng["state"]["inc"].to_bytes(16, "little"),
+            struct.pack("<BI", rng["has_uint32"], rng["uinteger"]),
+            self.grid.tobytes()))
+
+    def set_state(self, state):
+        """
+        Restores a snapshot of the game state returned by get_state.
+        """
+        next_color, = struct.unpack_from("<B", state)
+        offset = 1
+        # the generator takes 32 bytes of state and 5 bytes of buffered output
+        grid_offset = offset + 37
+        if len(state) != grid_offset + self.grid.size:
+            raise ValueError("Snapshot does not match the board size")
+        has_uint32, uinteger = struct.unpack_from("<BI", state, offset + 32)
+        self.np_random.bit_generator.state = {
+            "bit_generator": "PCG64",
+            "state": {"state": int.from_bytes(state[offset:offset + 16], "little"),
+                      "inc": int.from_bytes(state[offset + 16:offset + 32], "little")},
+            "has_uint32": has_uint32,
+            "uinteger": uinteger}
+        np.copyto(self.grid, np.frombuffer(state, dtype=np.uint8, offset=grid_offset).reshape(
+            self.array_height, self.array_width))
+        self.next_bubble = Bubble(
+            self.start_x,
+            self.start_y,
+            self.colors[next_color])
+        self._recount()
+        self.last_changes = []
+        self.last_path = []
+
     def render(self, mode='human', close=False):
         """
         This function renders the current game state in the given mode.
         """
         if mode == 'console':
-            print(self._get_game_state)
+            print(self._get_game_state())
+        elif mode == 'rgb_array':
+            if self._rgb_array_renderer is None:
+                self._rgb_array_renderer = RgbArrayRenderer(
+                    self.geometry, self.colors, self.render_scale, self.render_grayscale)
+            return self._rgb_array_renderer.render(
+                self.grid, self.color_dictionary[self.next_bubble.color])
         elif mode == "human":
-            try:
-                import pygame
-                from pygame import gfxdraw
-            except ImportError as e:
-                raise error.DependencyNotInstalled(
-                    "{}. (HINT: install pygame using `pip install pygame`".format(e))
             if close:
-                pygame.quit()
-            else:
-                if self.screen is None:
-                    pygame.init()
-                    self.screen = pygame.display.set_mode(
-                        (round(self.window_width), round(self.window_height)))
-                clock = pygame.time.Clock()
-                
-                # Draw old bubbles
-                self.screen.fill((255, 255, 255))
-                for row in range(self.array_height):
-                    for column in range(self.array_width):
-                        if self.last_board[row][column].color is not None:
-                            bubble = self.last_board[row][column]
-                            pygame.gfxdraw.filled_circle(
-                                self.screen, round(
-                                    bubble.center_x), round(
-                                    bubble.center_y), self.bubble_radius, bubble.color)
-                pygame.display.update()
-
-                # Draw flying bubble
-                last_x, last_y = None, None
-                for position in self.last_positions:
-                    if last_x is not None and last_y is not None:
-                        pygame.gfxdraw.filled_circle(
-                            self.screen, round(
-                            last_x), round(
-                            last_y), self.bubble_radius, (255,255,255))
-                    last_x, last_y = position[0], position[1]
-                    pygame.gfxdraw.filled_circle(
-                            self.screen, round(
-                            position[0]), round(
-                            position[1]), self.bubble_radius, self.last_color)
-                    pygame.display.update()
-                    clock.tick(self.metadata["video.frames_per_second"])
-                
-                # Draw new bubbles
-                self.screen.fill((255, 255, 255))
-                for row in range(self.array_height):
-                    for column in range(self.array_width):
-                        if self.board[row][column].color is not None:
-                            bubble = self.board[row][column]
-                            pygame.gfxdraw.filled_circle(
-                                self.screen, round(
-                                    bubble.center_x), round(
-                                    bubble.center_y), self.bubble_radius, bubble.color)
-                pygame.display.update()
+                self.close()
+                return
+            if self._human_renderer is None:
+                self._human_renderer = HumanRenderer(
+                    self.geometry, self.colors, self.render_fps,
+                    self.render_velocity, self.render_threaded)
+            # the last step can only be animated if it was recorded
+            self.record = True
+            # the board before the last step, by undoing its changes
+            last_grid = self.grid.copy()
+            for cell, color in reversed(self.last_changes):
+                last_grid.flat[cell] = color
+            self._human_renderer.show(
+                last_grid, self.grid.copy(), self.last_path, self.speed,
+                self.color_dictionary.get(self.last_color),
+                self.color_dictionary[self.next_bubble.color])
+            self.last_changes = []
+            self.last_path = []
         else:
             raise error.UnsupportedMode("Unsupported render mode: " + mode)
 
+    def close(self):
+        """
+        This function closes the window of the human render mode.
+        """
+        if self._human_renderer is not None:
+            self._human_renderer.close()
+            self._human_renderer = None
+
     def step(self, action):
         """
         This method steps the game forward one step and
@@ -176,49 +454,161 @@ class BubbleShooterEnv(gym.Env):
         if action <= 0 or action >= 180:
             raise Exception("Invalid action: {}".format(action))
 
-        self.last_board = copy.deepcopy(self.board)
-        self.last_color = self.next_bubble.color
+        stats = None
+        if self.instrumentation is not None:
+            stats = self._stats = self.instrumentation.start_step()
+            started = self._lap_start = time.perf_counter_ns()
+
+        if self.record:
+            self.last_color = self.next_bubble.color
+            self.last_changes = []
+            self.last_path = []
+        if self._loose is None:
+            # the grid was changed from outside, see _set_cell and _recount
+            self._loose = self.connectivity.unanchored(
+                memoryview(self.grid.ravel()), self.empty)
 
         # shoot bubble until it collides and set it to its new position
-        angle = copy.deepcopy(action)
-        self.last_positions = []
-        while True:
-            angle = self._move_next_bubble(angle)
-            self.last_positions.append((self.next_bubble.center_x, self.next_bubble.center_y))
-            if self._is_collided():
-                break
+        occupied = self.grid != self.empty
+        self.next_bubble.center_x, self.next_bubble.center_y = trajectory.cast(
+            self.start_x, self.start_y, action,
+            self.centers_x[occupied], self.centers_y[occupied],
+            self.bubble_radius, self.spacing, self.window_width, self.speed,
+            self.last_path if self.record else None, stats)
+        if stats is not None:
+            self._lap(stats, "trajectory_ns")
         row, column = self._set_next_bubble_position()
-        self.last_positions.append((row, column))
+        cell = row * self.array_width + column
+        cells = memoryview(self.grid.ravel())
+        if not self.connectivity.has_neighbor(cells, cell, self.empty):
+            self._loose.add(cell)
+        if stats is not None:
+            self._lap(stats, "snapping_ns")
 
         # calculate all neighbors and delete if two or more of the same color
         # were hit
         neighborhood = self._get_neighborhood(row, column)
+        if stats is not None:
+            stats["neighborhood_cells"] = len(neighborhood)
+            self._lap(stats, "neighborhood_ns")
+        popped = 0
         if len(neighborhood) >= 3:
             self._delete_bubbles(neighborhood)
-            self._delete_floaters()
-            self._update_color_list()
+            popped = len(neighborhood) + self._delete_floaters(neighborhood)
 
-        # create new next_bubble
-        random.shuffle(self.color_list)
+        # create new next_bubble of a color that is left on the board
         self.next_bubble = Bubble(
             self.start_x,
             self.start_y,
-            self.color_list[0])
+            self.colors[_random_color(self.np_random, self._color_counts)])
+        if stats is not None:
+            self._lap(stats, "floaters_ns")
 
         result, done = self._is_over()
+        if stats is not None:
+            self._lap(stats, "terminal_ns")
         state = self._get_game_state()
+        if stats is not None:
+            self._lap(stats, "observation_ns")
         reward = self._get_reward(len(neighborhood), result)
-        return state, reward, done, {}
+        info = {"state_hash": self.state_hash, "popped": popped}
+        if self.action_mask:
+            info["action_mask"] = self.get_action_mask()
+        if stats is not None:
+            stats["step_ns"] = time.perf_counter_ns() - started
+            self._stats = None
+            self.instrumentation.add(stats)
+            info["stats"] = stats
+        return state, reward, done, info
+
+    def simulate_all_actions(self, actions=None):
+        """
+        Calculates the outcome of the given actions from the current
+        state, without changing the environment.
+
+        The trajectories of all actions are calculated together and every
+        cell in which one of them lands is only evaluated once.
+
+        Parameters
+        ----------
+        actions : array_like
+            The actions to simulate, all actions of the action_space if None.
+
+        Returns
+        -------
+        outcome : dict
+            arrays with an entry for every action:
+            "actions", "rows" and "columns" of the cells the bubbles land in,
+            "cluster_sizes" as returned by _get_neighborhood, the number of
+            deleted "floaters", "rewards" and "dones".
+        """
+        if actions is None:
+            actions = np.arange(self.action_space.n)
+        actions = np.asarray(actions, dtype=np.int64).reshape(-1)
+        # add one due to discrete action_space
+        angles = actions + 1
+        if (angles <= 0).any() or (angles >= 180).any():
+            raise Exception("Invalid actions: {}".format(actions))
+
+        # shoot all bubbles on the same board
+        count = len(angles)
+        occupied = np.broadcast_to(self.grid != self.empty, (count,) + self.grid.shape)
+        x, y = trajectory.cast_batch(
+            np.full(count, self.start_x), np.full(count, self.start_y), angles,
+            occupied.reshape(count, -1), self.centers_x, self.centers_y,
+            self.bubble_radius, self.spacing, self.window_width, self.speed)
+        rows, columns = batch.snap(x, y, occupied, self.centers_x, self.centers_y)
+
+        # evaluate every landing cell once on its own copy of the board
+        cells, inverse = np.unique(rows * self.array_width + columns, return_inverse=True)
+        cell_rows, cell_columns = np.divmod(cells, self.array_width)
+        grids = np.repeat(self.grid[None], len(cells), axis=0)
+        grids[np.arange(len(cells)), cell_rows, cell_columns] = \
+            self.color_dictionary[self.next_bubble.color]
+        sizes, floaters = batch.pop(grids, cell_rows, cell_columns, self.empty)
+        rewards, dones = batch.outcome(grids, sizes, self.death_line,
+                                       self.empty, self.rewards)
+
+        return {"actions": actions,
+                "rows": rows,
+                "columns": columns,
+                "cluster_sizes": sizes[inverse],
+                "floaters": floaters[inverse],
+                "rewards": rewards[inverse],
+                "dones": dones[inverse]}
+
+    def get_action_classes(self):
+        """
+        Groups the actions by the cell in which their bubble
+        lands from the current state.
+
+        Returns
+        -------
+        classes : dict
+            arrays with an entry for every action: "actions", "rows" and
+            "columns" of the cells the bubbles land in and "canonical",
+            the smallest action that lands in the same cell.
+        """
+        self._action_classes.update(self.grid != self.empty)
+        rows, columns = np.divmod(self._action_classes.cells, self.array_width)
+        return {"actions": self._action_classes.actions,
+                "rows": rows,
+                "columns": columns,
+                "canonical": self._action_classes.classes()}
+
+    def get_action_mask(self):
+        """
+        Returns a boolean mask of the actions, that is true for
+        exactly one action per cell a bubble can land in.
+        """
+        classes = self.get_action_classes()
+        return classes["canonical"] == classes["actions"]
 
     def _get_reward(self, bubbles, result):
         """
         This function calculates the reward.
         """
-        rewards = {"hit": 1,
-                   "miss": -1,
-                   "pop": 10,
-                   "win": 200,
-                   "lost": -200}
+        rewards = self.rewards
 
         # Return win or loose
         if len(result) > 0:
@@ -235,281 +625,226 @@ class BubbleShooterEnv(gym.Env):
 
     def _update_color_list(self):
         """
-        This function updates the color list
-        based on what colors are still in the game.
+        This function returns the colors
+        that are still in the game.
         """
-        remaining_colors = set()
+        return [color for color, count in zip(self.colors, self._color_counts) if count]
 
-        for row in range(self.array_height):
-            for column in range(self.array_width):
-                if self.board[row][column].color is not None:
-                    remaining_colors.add(self.board[row][column].color)
+    @property
+    def row_fill(self):
+        """
+        The number of bubbles in every row of the game board.
+        """
+        return np.array(self._row_counts)
+
+    @property
+    def state_hash(self):
+        """
+        The 64 bit Zobrist hash of the color grid and the next bubble,
+        as an int that is the same for equal game states in every process,
+        see ZobristKeys.
+        """
+        return self._board_hash ^ self.zobrist.next_key(
+            self.color_dictionary[self.next_bubble.color])
 
-        return list(remaining_colors)
+    @property
+    def board(self):
+        """
+        The game board as a list of lists of bubbles.
+        """
+        return BoardView(self)
 
     def _make_blank_board(self):
         """
-        This function creates an empty array with the global size and returns it.
-        """
-        array = []
-        for _ in range(self.array_height):
-            column = []
-            for _ in range(self.array_width):
-                column.append(Bubble())
-            array.append(column)
-        return array
-
-    def _set_bubble_positions(self):
-        """
-        This function sets the positional arguments of the bubbles
-        in the game board.
-        """
-        # set the x-values for every bubble
-        for row in range(self.array_height):
-            for column in range(self.array_width):
-                self.board[row][column].center_x = (
-                    self.bubble_radius * 2 + self.spacing) * column + self.bubble_radius + self.spacing
-
-        # adjust the x-value in every second row
-        for row in range(1, self.array_height, 2):
-            for column in range(self.array_width):
-                self.board[row][column].center_x += self.bubble_radius + \
-                    0.5 * self.spacing
-
-        # calculate the row distance on the y-axis based on the spacing
-        y_distance = abs(math.sqrt((2 * self.bubble_radius + self.spacing)
-                                   ** 2 - (self.bubble_radius + 0.5 * self.spacing)**2))
-
-        # set the y-values for every bubble
-        for row in range(self.array_height):
-            for column in range(self.array_width):
-                self.board[row][column].center_y = self.spacing + \
-                    self.bubble_radius + row * y_distance
-
-    def _fill_board(self):
-        """
-        This function fills the game board's initial
-        lines with bubbles.
-        """
-        for row in range(self.initial_lines):
-            for column in range(self.array_width):
-                random.seed(self.seed+column)
-                random.shuffle(self.color_list)
-                self.board[row][column].color = self.color_list[0]
-
-    def _move_next_bubble(self, angle):
-        """
-        Moves the next_bubble forward at the global speed.
-        """
-        # Calculate the movement in x- and y-direction
-        if angle == 90:
-            xmove = 0
-            ymove = self.speed * -1
-        elif angle < 90:
-            xmove = math.cos(math.radians(angle)) * self.speed * -1
-            ymove = math.sin(math.radians(angle)) * self.speed * -1
-        else:
-            xmove = math.cos(math.radians(180 - angle)) * self.speed
-            ymove = math.sin(math.radians(180 - angle)) * self.speed * -1
-        self.next_bubble.center_x += xmove
-        self.next_bubble.center_y += ymove
-
-        # collision with left wall
-        if self.next_bubble.center_x - self.bubble_radius <= self.spacing:
-            angle = 180 - angle
-        # collision with right wall
-        elif self.next_bubble.center_x + self.bubble_radius >= self.window_width - self.spacing:
-            angle = 180 - angle
-        return angle
+        This function creates an empty color grid with the global size and returns it.
+        """
+        return np.full((self.array_height, self.array_width),
+                       self.empty, dtype=np.uint8)
+
+    def _make_board_pool(self, boards):
+        """
+        Returns the start states of the boards in the pool, as returned by
+        _initial_state together with the bubbles not connected to the top.
+        """
+        pool = []
+        if np.isscalar(boards):
+            seeds = np.random.SeedSequence(self._seed).generate_state(int(boards), np.uint64)
+            for seed in seeds:
+                pool.append(_initial_state.__wrapped__(
+                    self.array_height, self.array_width, len(self.colors),
+                    self.initial_lines, int(seed)) + ((),))
+            return pool
+
+        boards = np.asarray(boards, dtype=np.uint8)
+        if boards.ndim != 3 or boards.shape[1:] != (self.array_height, self.array_width):
+            raise ValueError("board_pool has to be of shape (boards, {}, {})".format(
+                self.array_height, self.array_width))
+        if (boards > self.empty).any():
+            raise ValueError("board_pool contains invalid color indices")
+        for index, board in enumerate(boards):
+            random_generator = np.random.Generator(np.random.PCG64([self._seed, index]))
+            loose = self.connectivity.unanchored(memoryview(board.ravel()), self.empty)
+            pool.append(_start_state(board.copy(), len(self.colors), random_generator)
+                        + (tuple(loose),))
+        return pool
+
+    def _recount(self):
+        """
+        Counts the bubbles of every color and in every row and hashes
+        the board again, after the grid was changed from outside.
+        The bubbles not connected to the top are searched again by the
+        next step.
+        """
+        self._color_counts, self._row_counts = _count_bubbles(self.grid, len(self.colors))
+        self._board_hash = self.zobrist.board_hash(self.grid)
+        self._loose = None
+
+    def _set_cell(self, cell, color):
+        """
+        Sets the color index of a cell (flat index of the grid) from
+        outside of step and updates the counts and the hash with it.
+        The bubbles not connected to the top are searched again by the
+        next step.
+        """
+        cells = self.grid.ravel()
+        old = int(cells[cell])
+        if old == color:
+            return
+        row = cell // self.array_width
+        if old != self.empty:
+            self._color_counts[old] -= 1
+            self._row_counts[row] -= 1
+        if color != self.empty:
+            self._color_counts[color] += 1
+            self._row_counts[row] += 1
+        # the key of the empty color is 0
+        self._board_hash ^= self.zobrist.key(cell, old) ^ self.zobrist.key(cell, color)
+        cells[cell] = color
+        self._loose = None
+
+    def _lap(self, stats, phase):
+        """
+        Records the nanoseconds since the last phase of the step as the given phase.
+        """
+        now = time.perf_counter_ns()
+        stats[phase] = now - self._lap_start
+        self._lap_start = now
 
     def _set_next_bubble_position(self):
         """
         Sets the next_bubble to its new position in the game board
         and returns the postion.
         """
-        # calculate distances to all empty places
-        empty_bubble_list = []
-        for row in range(self.array_height):
-            for column in range(self.array_width):
-                if self.board[row][column].color is None:
-                    current = self.board[row][column]
-                    distance = self._bubble_center_distance(
-                        self.next_bubble, current)
-                    empty_bubble_list.append(
-                        (distance, current.center_x, current.center_y, row, column))
-
-        # select place with smallest distance to next_bubble
-        minimum = min(empty_bubble_list, key=lambda t: t[0])
+        cell = self._closest_empty(self.next_bubble.center_x, self.next_bubble.center_y)
+        row, column = divmod(cell, self.array_width)
 
         # set the next_bubble to its new loaction
-        self.next_bubble.center_x = minimum[1]
-        self.next_bubble.center_y = minimum[2]
-        self.board[minimum[3]][minimum[4]] = self.next_bubble
+        self.next_bubble.center_x = self._centers_x[cell]
+        self.next_bubble.center_y = self._centers_y[cell]
+        if self.record:
+            self.last_changes.append((cell, self.empty))
+        color = self.color_dictionary[self.next_bubble.color]
+        self.grid[row, column] = color
+        self._color_counts[color] += 1
+        self._row_counts[row] += 1
+        self._board_hash ^= self.zobrist.key(cell, color)
+
+        return row, column
+
+    def _closest_empty(self, x, y):
+        """
+        Returns the flat index of the empty cell closest to (x, y).
+
+        Only the cells up to one row and column away from the cell at
+        (x, y) are searched, unless a cell outside of them could be closer.
+        """
+        geometry = self.geometry
+        offset = geometry.spacing + geometry.bubble_radius  # center of the first cell
+        row = round((y - offset) / geometry.row_distance)
+        column = round((x - offset) / geometry.column_distance)
+        top, bottom = max(row - 1, 0), min(row + 1, self.array_height - 1)
+        left, right = max(column - 1, 0), min(column + 1, self.array_width - 1)
+
+        cells = memoryview(self.grid.ravel())
+        closest, best = None, math.inf
+        for row in range(top, bottom + 1):
+            for cell in range(row * self.array_width + left, row * self.array_width + right + 1):
+                if cells[cell] == self.empty:
+                    dx = x - self._centers_x[cell]
+                    dy = y - self._centers_y[cell]
+                    distance = math.sqrt(dx * dx + dy * dy)
+                    if distance < best:
+                        closest, best = cell, distance
+
+        # a lower bound of the distance to all cells outside of the window
+        bound = math.inf
+        if top > 0:
+            bound = min(bound, y - self._centers_y[(top - 1) * self.array_width])
+        if bottom < self.array_height - 1:
+            bound = min(bound, self._centers_y[(bottom + 1) * self.array_width] - y)
+        if left > 0:
+            bound = min(bound, x - self._centers_x[self.array_width + left - 1])
+        if right < self.array_width - 1:
+            bound = min(bound, self._centers_x[right + 1] - x)
+        if closest is not None and best < bound:
+            return closest
 
-        return minimum[3], minimum[4]
+        # calculate distances to all empty places
+        distances = np.sqrt((x - self.centers_x)**2 + (y - self.centers_y)**2)
+        distances[self.grid != self.empty] = np.inf
+        return int(np.argmin(distances))
 
     def _delete_bubbles(self, bubbles):
         """
-        Deletes all given bubbles (tuples with x and y coordinate).
+        Deletes all given bubbles (flat indices of the grid).
         """
+        cells = self.grid.ravel()
+        if self.record:
+            self.last_changes.extend((bubble, cells[bubble]) for bubble in bubbles)
+        colors = memoryview(cells)
+        keys = self.zobrist._board_keys
+        stride = self.empty + 1
+        board_hash = self._board_hash
         for bubble in bubbles:
-            self.board[bubble[0]][bubble[1]].color = None
-
-    def _delete_floaters(self):
-        """
-        Deletes all floating bubbles.
-        """
-        # All bubbles to keep
-        connected_to_top = set()
-        # All bubbles to examine
-        pending = set()
-
-        # Add all bubbles in the first row to pending
-        for column in range(self.array_width):
-            if self.board[0][column].color is not None:
-                pending.add((0, column))
-
-        # Calculate all bubbles that are connected to the top
-        while len(pending) > 0:
-            current = pending.pop()
-            connected_to_top.add(current)
-            for bubble in self._get_neighbors(
-                    current[0], current[1], check_color=False):
-                if bubble not in connected_to_top and self.board[bubble[0]
-                                                                 ][bubble[1]].color is not None:
-                    pending.add(bubble)
-
-        # Get a set of all bubbles
-        all_bubbles = set()
-        for row in range(self.array_height):
-            for column in range(self.array_width):
-                if self.board[row][column].color is not None:
-                    all_bubbles.add((row, column))
-
-        # Delete bubbles
-        to_be_deleted = all_bubbles.difference(connected_to_top)
-        self._delete_bubbles(to_be_deleted)
+            color = colors[bubble]
+            self._color_counts[color] -= 1
+            self._row_counts[bubble // self.array_width] -= 1
+            board_hash ^= keys[bubble * stride + color]
+        self._board_hash = board_hash
+        cells[list(bubbles)] = self.empty
+
+    def _delete_floaters(self, deleted):
+        """
+        Deletes all floating bubbles after the given bubbles were deleted.
+
+        Only the bubbles next to the deleted ones can have lost their
+        connection to the top, together with the loose bubbles that were
+        placed without any neighbor. Returns the number of deleted bubbles.
+        """
+        candidates = self.connectivity.border(deleted)
+        candidates.update(self._loose)
+        self._loose = set()
+        floaters = self.connectivity.floaters(
+            memoryview(self.grid.ravel()), self.empty, candidates, self._stats)
+        if self._stats is not None:
+            self._stats["floaters"] = len(floaters)
+        self._delete_bubbles(floaters)
+        return len(floaters)
 
     def _get_neighborhood(self, row, column):
         """
-        Returns a list of all coherent bubbles of the same color.
-        """
-        # all visited bubbles in the neighborhood
-        neighborhood = set()
-        # all unvisited bubbles in the neighborhood
-        pending = set()
-        pending.add((row, column))
-
-        while (len(pending) > 0):
-            current = pending.pop()
-            neighborhood.add(current)
-            for bubble in self._get_neighbors(
-                    current[0], current[1], self.board[current[0]][current[1]].color, check_color=True):
-                if bubble not in neighborhood:
-                    pending.add(bubble)
-
-        return neighborhood
-
-    def _get_neighbors(self, row, column, color=None, check_color=True):
-        """
-        Returns all direct neighbors of a bubble that are in the given color.
-        """
-        neighbors = []
-        if row % 2 == 0:
-            if column + 1 < self.array_width:
-                if self.board[row][column +
-                                   1].color == color or not check_color:
-                    neighbors.append((row, column + 1))  # right
-            if column - 1 >= 0:
-                if self.board[row][column -
-                                   1].color == color or not check_color:
-                    neighbors.append((row, column - 1))  # left
-            if row - 1 >= 0:
-                if self.board[row -
-                              1][column].color == color or not check_color:
-                    neighbors.append((row - 1, column))  # top right
-            if row - 1 >= 0 and column - 1 >= 0:
-                if self.board[row - 1][column -
-                                       1].color == color or not check_color:
-                    neighbors.append((row - 1, column - 1))  # top left
-            if row + 1 < self.array_height:
-                if self.board[row +
-                              1][column].color == color or not check_color:
-                    neighbors.append((row + 1, column))  # bottom right
-            if row + 1 < self.array_height and column - 1 >= 0:
-                if self.board[row + 1][column -
-                                       1].color == color or not check_color:
-                    neighbors.append((row + 1, column - 1))  # bottom left
-        else:
-            if column + 1 < self.array_width:
-                if self.board[row][column +
-                                   1].color == color or not check_color:
-                    neighbors.append((row, column + 1))  # right
-            if column - 1 >= 0:
-                if self.board[row][column -
-                                   1].color == color or not check_color:
-                    neighbors.append((row, column - 1))  # left
-            if row - 1 >= 0:
-                if self.board[row -
-                              1][column].color == color or not check_color:
-                    neighbors.append((row - 1, column))  # top left
-            if row - 1 >= 0 and column + 1 < self.array_width:
-                if self.board[row - 1][column +
-                                       1].color == color or not check_color:
-                    neighbors.append((row - 1, column + 1))  # top right
-            if row + 1 < self.array_height:
-                if self.board[row +
-                              1][column].color == color or not check_color:
-                    neighbors.append((row + 1, column))  # bottom left
-            if row + 1 < self.array_height and column + 1 < self.array_width:
-                if self.board[row + 1][column +
-                                       1].color == color or not check_color:
-                    neighbors.append((row + 1, column + 1))  # bottom right
-        return neighbors
-
-    def _is_collided(self):
-        """
-        This function returns true if next_bubble is collided
-        with another bubble or the top of the screen, false otherwise.
-        """
-        # collsion with top
-        if self.next_bubble.center_y - self.bubble_radius <= self.spacing:
-            return True
-        # collision with another bubble
-        for row in range(self.array_height):
-            for column in range(self.array_width):
-                if self.board[row][column].color is None:
-                    continue
-                distance = self._bubble_center_distance(
-                    self.next_bubble, self.board[row][column]) - self.bubble_radius * 2
-                if distance < 0:
-                    return True
-        return False
-
-    def _bubble_center_distance(self, bubble1, bubble2):
-        """
-        Calculates the distance between the centers of two given bubbles.
-        """
-        return math.sqrt((bubble1.center_x - bubble2.center_x)
-                         ** 2 + (bubble1.center_y - bubble2.center_y)**2)
+        Returns the flat indices of all coherent bubbles of the same color.
+        """
+        return self.connectivity.cluster(
+            memoryview(self.grid.ravel()), row * self.array_width + column)
 
     def _get_game_state(self):
         """
         This function returns the current game state.
         len(self.colors) means None
         """
-        state = {}
-        state["next_bubble"] = self.color_dictionary[self.next_bubble.color]
-        bubbles = []
-        for row in range(self.array_height):
-            for column in range(self.array_width):
-                if self.board[row][column].color is not None:
-                    bubbles.append(
-                        self.color_dictionary[self.board[row][column].color])
-                else:
-                    bubbles.append(len(self.colors))
-        state["board"] = bubbles
-        return state
+        return self.observation_encoder.encode(
+            self.grid, self.color_dictionary[self.next_bubble.color])
 
     def _is_over(self):
         """
@@ -517,13 +852,9 @@ class BubbleShooterEnv(gym.Env):
         over or not.
         """
         # check if deadline is reached
-        for row in range(self.death_line, self.array_height):
-            for column in range(self.array_width):
-                if self.board[row][column].color is not None:
-                    return "lost", True
+        if any(self._row_counts[self.death_line:]):
+            return "lost", True
         # check if board is blank
-        for row in range(self.array_height):
-            for column in range(self.array_width):
-                if self.board[row][column].color is not None:
-                    return "", False
+        if any(self._color_counts):
+            return "", False
         return "win", True
@@ -0,0 +1,160 @@
+import gym
+import numpy as np
+import sys
+import random
+from gym import spaces
+from gym_bubbleshooter.envs import batch, trajectory
+from gym_bubbleshooter.envs.bubbleshooter_env import BubbleShooterEnv
+from gym_bubbleshooter.envs.geometry import Geometry
+from gym_bubbleshooter.envs.observation import ObservationEncoder
+
+
+class BubbleShooterVecEnv(gym.Env):
+    """
+    N games of bubble shooter, that are stepped together
+    with batched array operations.
+
+    All boards are kept in one color grid of shape (N, height, width).
+    Boards whose game is over are reset automatically at the end of step.
+    """
+    metadata = {'render.modes': []}
+
+    colors = BubbleShooterEnv.colors
+    rewards = BubbleShooterEnv.rewards
+
+    def __init__(self, num_envs=64, seed=None, observation_format="flat", observation_view=False,
+                 array_height=14, array_width=16, num_colors=7, bubble_radius=20,
+                 spacing=5, initial_lines=5, speed=1):
+        """
+        Parameters
+        ----------
+        num_envs : int
+            The number of boards.
+        seed : int
+            The seed of the random number generator of all boards.
+        observation_format : str
+            The format of the boards in the game states,
+            "flat", "grid" or "onehot", see ObservationEncoder.
+        observation_view : bool
+            Whether the game states are returned as views on buffers that
+            are overwritten by the next step, instead of copies.
+        array_height, array_width, num_colors, bubble_radius, spacing, initial_lines, speed : int
+            The configuration of the boards, see BubbleShooterEnv.
+        """
+        if not 1 <= num_colors <= len(self.colors):
+            raise ValueError("num_colors has to be between 1 and {}".format(len(self.colors)))
+        if not 0 < initial_lines < array_height - 2:
+            raise ValueError("initial_lines has to be between 1 and array_height - 3")
+        self.num_envs = num_envs
+        self.seed(seed)
+        self.geometry = Geometry.cached(array_height, array_width, bubble_radius, spacing)
+        self.initial_lines = initial_lines
+        self.speed = speed
+        self.colors = self.colors[:num_colors]
+        self.empty = len(self.colors)  # color index of an empty cell
+        self.action_space = spaces.MultiDiscrete([179] * num_envs)
+        self.observation_encoder = ObservationEncoder(
+            self.geometry.array_height, self.geometry.array_width, len(self.colors),
+            observation_format, observation_view, batch=num_envs)
+        self.observation_space = self.observation_encoder.space()
+        self.reset()
+
+    def seed(self, seed=None):
+        """
+        Sets the seed of the random number generator of all boards,
+        random if None, and returns it in a list.
+        """
+        if seed is None:
+            seed = random.randint(0, sys.maxsize)
+        self._seed = seed
+        self.np_random = np.random.default_rng(seed)
+        return [seed]
+
+    def reset(self):
+        """
+        This function resets all environments and returns the game states.
+        """
+        self.grids = np.empty((self.num_envs, self.geometry.array_height,
+                               self.geometry.array_width), dtype=np.uint8)
+        self.next_colors = np.empty(self.num_envs, dtype=np.uint8)
+        self._reset_boards(np.ones(self.num_envs, dtype=bool))
+        return self._get_game_state()
+
+    def step(self, actions):
+        """
+        This method steps all games forward one step and
+        shoots a bubble at the given angle on every board.
+
+        Parameters
+        ----------
+        actions : array_like
+            An array of shape (N,) with an action of BubbleShooterEnv
+            for every board.
+
+        Returns
+        -------
+        ob, reward, episode_over, info : tuple
+            ob (dict) :
+                the stacked game states, of the reset boards where
+                the game was over.
+            reward (numpy.ndarray) :
+                the rewards achieved by the actions.
+            episode_over (numpy.ndarray) :
+                whether the game on each board was over and it was reset.
+            info (dict) :
+                "terminal_board" holds the boards before they were reset,
+                if any game was over.
+        """
+        # add one due to discrete action_space
+        angles = np.asarray(actions, dtype=np.int64) + 1
+        # test if actions are valid
+        if angles.shape != (self.num_envs,) or (angles <= 0).any() or (angles >= 180).any():
+            raise Exception("Invalid actions: {}".format(actions))
+
+        geometry = self.geometry
+        occupied = self.grids != self.empty
+        x, y = trajectory.cast_batch(
+            np.full(self.num_envs, geometry.start_x),
+            np.full(self.num_envs, geometry.start_y), angles,
+            occupied.reshape(self.num_envs, -1),
+            geometry.centers_x, geometry.centers_y, geometry.bubble_radius,
+            geometry.spacing, geometry.window_width, self.speed)
+        rows, columns = batch.snap(x, y, occupied, geometry.centers_x, geometry.centers_y)
+        self.grids[np.arange(self.num_envs), rows, columns] = self.next_colors
+
+        # calculate all neighbors and delete if two or more of the same color
+        # were hit
+        sizes, _ = batch.pop(self.grids, rows, columns, self.empty)
+        self.next_colors = batch.random_colors(self.grids, len(self.colors), self.np_random)
+
+        rewards, dones = batch.outcome(self.grids, sizes, geometry.death_line,
+                                       self.empty, self.rewards)
+
+        info = {}
+        if dones.any():
+            info["terminal_board"] = self.grids.reshape(self.num_envs, -1).copy()
+            self._reset_boards(dones)
+        return self._get_game_state(), rewards, dones, info
+
+    def render(self, mode='human', close=False):
+        raise gym.error.UnsupportedMode("Unsupported render mode: " + mode)
+
+    def _reset_boards(self, mask):
+        """
+        Fills the initial lines of the selected boards with
+        random bubbles and draws their next bubbles.
+        """
+        count = int(mask.sum())
+        self.grids[mask] = self.empty
+        self.grids[mask, :self.initial_lines] = self.np_random.integers(
+            0, len(self.colors), (count, self.initial_lines,
+                                  self.geometry.array_width), dtype=np.uint8)
+        self.next_colors[mask] = batch.random_colors(
+            self.grids[mask], len(self.colors), self.np_random)
+
+    def _get_game_state(self):
+        """
+        This function returns the current game states.
+        len(self.colors) means None
+        """
+        return self.observation_encoder.encode(self.grids, self.next_colors)
@@ -0,0 +1,122 @@
+import functools
+import numpy as np
+
+
+class Connectivity():
+    """
+    Neighbor tables of the hexagonal game board and the searches for
+    clusters and floating bubbles on the flattened color grid.
+
+    Cells are numbered row by row. Every second row is shifted to the
+    right by half a bubble, so the neighbors above and below a cell
+    depend on whether its row is even or odd.
+
+    Use Connectivity.cached to share the tables between all
+    environments with the same board size.
+    """
+
+    # (row, column) offsets of the neighbors, the ones above come last
+    even_offsets = [(0, 1), (0, -1), (1, 0), (1, -1), (-1, 0), (-1, -1)]
+    odd_offsets = [(0, 1), (0, -1), (1, 0), (1, 1), (-1, 0), (-1, 1)]
+
+    def __init__(self, array_height, array_width):
+        self.array_height = array_height
+        self.array_width = array_width
+        # flat neighbor indices of every cell, -1 where there is none
+        self.neighbors = np.full((array_height * array_width, 6), -1, dtype=np.int64)
+        for row in range(array_height):
+            offsets = self.odd_offsets if row % 2 else self.even_offsets
+            for column in range(array_width):
+                for i, (row_offset, column_offset) in enumerate(offsets):
+                    if 0 <= row + row_offset < array_height and \
+                            0 <= column + column_offset < array_width:
+                        self.neighbors[row * array_width + column, i] = \
+                            (row + row_offset) * array_width + column + column_offset
+        self._neighbors = [tuple(int(n) for n in cell if n >= 0)
+                           for cell in self.neighbors]
+
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def cached(cls, array_height, array_width):
+        """
+        Returns the shared, read-only tables of the given board size.
+        """
+        connectivity = cls(array_height, array_width)
+        connectivity.neighbors.flags.writeable = False
+        return connectivity
+
+    def cluster(self, cells, start):
+        """
+        Returns the flat indices of all bubbles connected to the
+        start cell by bubbles of its color.
+
+        cells is the flattened color grid as a list or memoryview,
+        which is faster to index than an array.
+        """
+        color = cells[start]
+        cluster = {start}
+        pending = [start]
+        while pending:
+            for neighbor in self._neighbors[pending.pop()]:
+                if neighbor not in cluster and cells[neighbor] == color:
+                    cluster.add(neighbor)
+                    pending.append(neighbor)
+        return cluster
+
+    def has_neighbor(self, cells, cell, empty):
+        """
+        Returns whether the cell is in the top row or next to a bubble.
+        """
+        return cell < self.array_width or any(
+            cells[neighbor] != empty for neighbor in self._neighbors[cell])
+
+    def floaters(self, cells, empty, candidates, stats=None):
+        """
+        Returns the flat indices of all bubbles that are connected to
+        one of the candidate cells but not to the top row.
+
+        Every search starts at a candidate and stops as soon as it reaches
+        the top row, so the cost depends on the region around the
+        candidates and not on the size of the board. If a dictionary is
+        given as stats, the number of cells visited by the searches is
+        added to "floater_cells".
+        """
+        anchored = set()
+        floating = set()
+        for start in candidates:
+            if start in anchored or start in floating or cells[start] == empty:
+                continue
+            component = {start}
+            pending = [start]
+            while pending:
+                cell = pending.pop()
+                if cell < self.array_width:
+                    anchored |= component
+                    break
+                # the neighbors above are searched first
+                for neighbor in self._neighbors[cell]:
+                    if neighbor not in component and cells[neighbor] != empty:
+                        component.add(neighbor)
+                        pending.append(neighbor)
+            else:
+                floating |= component
+            if stats is not None:
+                stats["floater_cells"] += len(component)
+        return floating
+
+    def unanchored(self, cells, empty):
+        """
+        Returns the flat indices of all bubbles on the board
+        that are not connected to the top row.
+        """
+        return self.floaters(cells, empty, range(len(cells)))
+
+    def border(self, cells):
+        """
+        Returns the flat indices of all cells next to
+        the given cells that are not one of them.
+        """
+        border = set()
+        for cell in cells:
+            border.update(self._neighbors[cell])
+        return border.difference(cells)
@@ -0,0 +1,338 @@
+import collections
+import json
+import mmap
+import struct
+import gym
+import numpy as np
+from gym_bubbleshooter.envs.bubbleshooter_env import BubbleShooterEnv
+from gym_bubbleshooter.envs.zobrist import TranspositionTable
+
+# Every episode is one chunk, so files can be appended to:
+#   header: magic, version, flags, config size, seed, steps
+#   config: JSON with the configuration of the board
+#   actions: uint8 for every step
+#   rewards: int32 for every step, if FLAG_REWARDS
+#   popped: uint16 for every step, if FLAG_POPPED
+# Every section is padded to 4 bytes, so all arrays can be mapped in place.
+MAGIC = b"BSEP"
+VERSION = 1
+FLAG_REWARDS = 1
+FLAG_POPPED = 2
+FLAG_TERMINATED = 4
+_HEADER = struct.Struct("<4sBBHQI")
+
+Episode = collections.namedtuple(
+    "Episode", ["seed", "config", "actions", "rewards", "popped", "terminated"])
+Episode.__doc__ = """
+An episode read from a log. actions, rewards and popped are arrays
+mapped from the file, rewards and popped are None if not recorded.
+"""
+
+
+def _padded(size):
+    return (size + 3) & ~3
+
+
+def _config(env):
+    """
+    Returns the configuration of the board of the given BubbleShooterEnv.
+    """
+    return {"array_height": env.array_height,
+            "array_width": env.array_width,
+            "num_colors": len(env.colors),
+            "bubble_radius": env.bubble_radius,
+            "spacing": env.spacing,
+            "initial_lines": env.initial_lines,
+            "speed": env.speed}
+
+
+def encode_episode(seed, config, actions, rewards=None, popped=None, terminated=True):
+    """
+    Returns the chunk of an episode as bytes.
+    """
+    config = json.dumps(config, sort_keys=True).encode()
+    flags = FLAG_TERMINATED if terminated else 0
+    sections = [config, np.asarray(actions, dtype=np.uint8).tobytes()]
+    if rewards is not None:
+        flags |= FLAG_REWARDS
+        sections.append(np.asarray(rewards, dtype="<i4").tobytes())
+    if popped is not None:
+        flags |= FLAG_POPPED
+        sections.append(np.asarray(popped, dtype="<u2").tobytes())
+    chunk = bytearray(_HEADER.pack(MAGIC, VERSION, flags, len(config), seed, len(actions)))
+    for section in sections:
+        chunk += section + bytes(_padded(len(section)) - len(section))
+    return bytes(chunk)
+
+
+class EpisodeRecorder(gym.Wrapper):
+    """
+    Writes the episodes of a BubbleShooterEnv to a log file as the seed,
+    the configuration and the actions, which determine the whole episode,
+    together with the rewards and the number of popped bubbles of every
+    step if enabled. Episodes are appended to the file when they end,
+    an unfinished episode when the env is reset or closed.
+    """
+
+    def __init__(self, env, path, rewards=True, popped=True):
+        super().__init__(env)
+        if self.env.unwrapped._board_pool is not None:
+            raise ValueError("Episodes starting from a board pool can not be recorded")
+        self.path = path
+        self.record_rewards = rewards
+        self.record_popped = popped
+        self._file = open(path, "ab")
+        self._actions = None
+
+    def reset(self, **kwargs):
+        self._write()
+        state = self.env.reset(**kwargs)
+        self._seed = self.env.unwrapped._seed
+        self._actions = bytearray()
+        self._rewards = []
+        self._popped = []
+        return state
+
+    def step(self, action):
+        state, reward, done, info = self.env.step(action)
+        if self._actions is not None:
+            self._actions.append(int(action))
+            self._rewards.append(reward)
+            self._popped.append(info["popped"])
+            if done:
+                self._write(terminated=True)
+        return state, reward, done, info
+
+    def close(self):
+        if not self._file.closed:
+            self._write()
+            self._file.close()
+        return self.env.close()
+
+    def _write(self, terminated=False):
+        if self._actions:
+            self._file.write(encode_episode(
+                self._seed, _config(self.env.unwrapped), self._actions,
+                self._rewards if self.record_rewards else None,
+                self._popped if self.record_popped else None, terminated))
+            self._file.flush()
+        self._actions = None
+
+
+class EpisodeLog():
+    """
+    Reads the episodes of a log file written by EpisodeRecorder.
+
+    The file is memory mapped and its chunks are only parsed when they
+    are read, so a log can be streamed without loading it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files can not be mapped
+            self._buffer = b""
+        self._offsets = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        offset = 0
+        while offset < len(self._buffer):
+            episode, offset = self._read(offset)
+            yield episode
+
+    def __len__(self):
+        return len(self._index())
+
+    def __getitem__(self, index):
+        return self._read(self._index()[index])[0]
+
+    def close(self):
+        # the mapping is released once no array of an episode refers to it
+        self._buffer = b""
+        self._offsets = None
+        self._file.close()
+
+    def _index(self):
+        if self._offsets is None:
+            self._offsets = []
+            offset = 0
+            while offset < len(self._buffer):
+                self._offsets.append(offset)
+                offset = self._read(offset)[1]
+        return self._offsets
+
+    def _read(self, offset):
+        """
+        Returns the episode at the given offset and the offset of the next one.
+        """
+        magic, version, flags, config_size, seed, steps = _HEADER.unpack_from(
+            self._buffer, offset)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("No episode of version {} at offset {}".format(VERSION, offset))
+        offset += _HEADER.size
+        config = json.loads(bytes(self._buffer[offset:offset + config_size]))
+        offset += _padded(config_size)
+        actions = np.frombuffer(self._buffer, np.uint8, steps, offset)
+        offset += _padded(steps)
+        rewards = popped = None
+        if flags & FLAG_REWARDS:
+            rewards = np.frombuffer(self._buffer, "<i4", steps, offset)
+            offset += 4 * steps
+        if flags & FLAG_POPPED:
+            popped = np.frombuffer(self._buffer, "<u2", steps, offset)
+            offset += _padded(2 * steps)
+        return Episode(seed, config, actions, rewards, popped,
+                       bool(flags & FLAG_TERMINATED)), offset
+
+
+class ReplayEngine():
+    """
+    Rebuilds the game states of logged episodes by replaying their actions,
+    with one BubbleShooterEnv for every configuration.
+    """
+
+    def __init__(self, **env_kwargs):
+        """
+        env_kwargs are passed to every BubbleShooterEnv,
+        like the format of the observations.
+        """
+        self.env_kwargs = env_kwargs
+        self._envs = {}
+
+    def states(self, episode):
+        """
+        Yields the game state before every step of the episode, the action,
+        the reward and whether the game is over, while replaying it.
+        """
+        env = self._env(episode)
+        state = env.reset()
+        for step, action in enumerate(episode.actions.tolist()):
+            next_state, reward, done, _ = env.step(action)
+            if episode.rewards is not None and reward != episode.rewards[step]:
+                raise ValueError("Replay of the episode with seed {} diverged at step {}".format(
+                    episode.seed, step))
+            yield state, action, reward, done
+            state = next_state
+
+    def batch(self, episode):
+        """
+        Returns the game states before and after every step of the episode,
+        stacked into arrays, together with their state hashes and the
+        actions, rewards and dones.
+        """
+        env = self._env(episode)
+        steps = len(episode.actions)
+        cells = env.array_height * env.array_width
+        boards = np.empty((steps + 1, cells), dtype=np.uint8)
+        next_bubbles = np.empty(steps + 1, dtype=np.uint8)
+        hashes = np.empty(steps + 1, dtype=np.uint64)
+        rewards = np.empty(steps, dtype=np.int32)
+        dones = np.zeros(steps, dtype=bool)
+        env.reset()
+        for step, action in enumerate(episode.actions.tolist()):
+            boards[step] = env.grid.ravel()
+            next_bubbles[step] = env.color_dictionary[env.next_bubble.color]
+            hashes[step] = env.state_hash
+            _, rewards[step], dones[step], _ = env.step(action)
+        boards[steps] = env.grid.ravel()
+        next_bubbles[steps] = env.color_dictionary[env.next_bubble.color]
+        hashes[steps] = env.state_hash
+        if episode.rewards is not None and not np.array_equal(rewards, episode.rewards):
+            raise ValueError("Replay of the episode with seed {} diverged".format(episode.seed))
+        return {"board": boards, "next_bubble": next_bubbles, "state_hash": hashes,
+                "action": episode.actions,
+                "reward": rewards, "done": dones}
+
+    def _env(self, episode):
+        key = tuple(sorted(episode.config.items()))
+        if key not in self._envs:
+            self._envs[key] = BubbleShooterEnv(**episode.config, **self.env_kwargs)
+        env = self._envs[key]
+        env.seed(episode.seed)
+        return env
+
+
+class TransitionReader():
+    """
+    Streams the transitions of the episodes in the given log files,
+    one episode at a time.
+
+    Iterating yields dictionaries with "board", "next_bubble", "action",
+    "reward", "next_board", "next_next_bubble" and "done", one for every
+    transition, or arrays of batch_size transitions if batch_size is given.
+    The boards are flat color grids, "state_hash" is the hash of the
+    game state before the transition, see BubbleShooterEnv.state_hash.
+
+    With deduplicate, a transition is skipped if the same action was taken
+    in the same game state before, which is tracked by the state hashes
+    in a table of at most deduplicate_capacity entries.
+    """
+
+    def __init__(self, paths, batch_size=None, deduplicate=False, deduplicate_capacity=2**22):
+        self.paths = [paths] if isinstance(paths, str) else list(paths)
+        self.batch_size = batch_size
+        self.engine = ReplayEngine()
+        self.seen = TranspositionTable(deduplicate_capacity) if deduplicate else None
+
+    def __iter__(self):
+        pending = []
+        for path in self.paths:
+            with EpisodeLog(path) as log:
+                for episode in log:
+                    if len(episode.actions) == 0:
+                        continue
+                    transitions = self._transitions(self.engine.batch(episode))
+                    if self.seen is not None:
+                        transitions = self._deduplicate(transitions)
+                        if len(transitions["action"]) == 0:
+                            continue
+                    if self.batch_size is None:
+                        for index in range(len(transitions["action"])):
+                            yield {name: values[index] for name, values in transitions.items()}
+                        continue
+                    pending.append(transitions)
+                    yield from self._batches(pending, final=False)
+        if self.batch_size is not None:
+            yield from self._batches(pending, final=True)
+
+    @staticmethod
+    def _transitions(batch):
+        return {"board": batch["board"][:-1], "next_bubble": batch["next_bubble"][:-1],
+                "state_hash": batch["state_hash"][:-1],
+                "action": batch["action"], "reward": batch["reward"],
+                "next_board": batch["board"][1:], "next_next_bubble": batch["next_bubble"][1:],
+                "done": batch["done"]}
+
+    def _deduplicate(self, transitions):
+        """
+        Returns the transitions whose state and action were not seen before.
+        """
+        new = [self.seen.add((state_hash, action)) for state_hash, action in zip(
+            transitions["state_hash"].tolist(), transitions["action"].tolist())]
+        if all(new):
+            return transitions
+        return {name: values[new] for name, values in transitions.items()}
+
+    def _batches(self, pending, final):
+        """
+        Yields full batches of the pending transitions, and the rest if final.
+        """
+        available = sum(len(transitions["action"]) for transitions in pending)
+        while available >= self.batch_size or (final and available > 0):
+            joined = {name: np.concatenate([transitions[name] for transitions in pending])
+                      for name in pending[0]}
+            size = min(self.batch_size, available)
+            yield {name: values[:size] for name, values in joined.items()}
+            pending[:] = [{name: values[size:] for name, values in joined.items()}]
+            available -= size
+        if available == 0:
+            pending.clear()
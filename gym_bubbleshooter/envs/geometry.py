@@ -0,0 +1,65 @@
+import functools
+import math
+import numpy as np
+
+
+class Geometry():
+    """
+    The static layout of the game board: its size, the window size
+    and the centers of all cells (in pixel).
+
+    Use Geometry.cached to share one read-only instance between all
+    environments with the same configuration.
+    """
+
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def cached(cls, array_height=14, array_width=16, bubble_radius=20, spacing=5):
+        """
+        Returns the shared geometry of the given configuration,
+        whose arrays are read-only.
+        """
+        geometry = cls(array_height, array_width, bubble_radius, spacing)
+        geometry.centers_x.flags.writeable = False
+        geometry.centers_y.flags.writeable = False
+        return geometry
+
+    def __init__(self, array_height=14, array_width=16, bubble_radius=20, spacing=5):
+        self.array_height = array_height
+        self.array_width = array_width
+        self.death_line = self.array_height - 2
+        self.spacing = spacing  # in pixel
+        self.bubble_radius = bubble_radius  # in pixel
+        self.window_height = (self.array_height * self.bubble_radius * 2
+                              + self.spacing * (self.array_height + 2)
+                              + 6 * self.bubble_radius)
+        self.window_width = (self.array_width * self.bubble_radius * 2
+                             + self.spacing * (self.array_width + 1)
+                             + self.bubble_radius + 0.5 * self.spacing)
+        self.start_x = self.window_width / 2.0
+        self.start_y = self.window_height - self.spacing - self.bubble_radius
+        self._set_bubble_positions()
+
+    def _set_bubble_positions(self):
+        """
+        This function calculates the centers of all cells
+        in the game board.
+        """
+        # set the x-values for every bubble
+        self.centers_x = np.empty((self.array_height, self.array_width))
+        self.centers_x[:] = (self.bubble_radius * 2 + self.spacing) * \
+            np.arange(self.array_width) + self.bubble_radius + self.spacing
+
+        # adjust the x-value in every second row
+        self.centers_x[1::2] += self.bubble_radius + 0.5 * self.spacing
+
+        # calculate the row distance on the y-axis based on the spacing
+        y_distance = abs(math.sqrt((2 * self.bubble_radius + self.spacing)
+                                   ** 2 - (self.bubble_radius + 0.5 * self.spacing)**2))
+        self.row_distance = y_distance
+        self.column_distance = self.bubble_radius * 2 + self.spacing
+
+        # set the y-values for every bubble
+        self.centers_y = np.empty((self.array_height, self.array_width))
+        self.centers_y[:] = (self.spacing + self.bubble_radius
+                             + np.arange(self.array_height) * y_distance)[:, None]
@@ -0,0 +1,67 @@
+import collections
+import json
+
+
+class Instrumentation():
+    """
+    Running histograms of the statistics of every step.
+
+    Every statistic is counted in buckets of powers of two, the bucket
+    of a value v holds all values with the same bit length, that is
+    2**(b - 1) <= v < 2**b for the bucket b, and 0 for the bucket 0.
+    """
+    # the statistics that are counted up during a step
+    counters = ("trajectory_segments", "wall_bounces", "trajectory_steps",
+                "collision_checks", "floater_cells", "floaters")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """
+        Clears all histograms.
+        """
+        self.steps = 0
+        self._buckets = collections.defaultdict(collections.Counter)
+        self._sums = collections.Counter()
+        self._maxima = {}
+
+    def start_step(self):
+        """
+        Returns the statistics of a new step, with all counters at zero.
+        """
+        return dict.fromkeys(self.counters, 0)
+
+    def add(self, stats):
+        """
+        Adds the statistics of one step, a dictionary of non-negative integers.
+        """
+        self.steps += 1
+        for name, value in stats.items():
+            self._buckets[name][value.bit_length()] += 1
+            self._sums[name] += value
+            if value > self._maxima.get(name, -1):
+                self._maxima[name] = value
+
+    def export(self, path=None):
+        """
+        Returns the histograms as a dictionary, that maps every statistic
+        to its count, sum, mean, maximum and the lower bounds and counts of
+        its non-empty buckets. If a path is given, they are also written
+        to it as JSON.
+        """
+        histograms = {}
+        for name, buckets in self._buckets.items():
+            bits = sorted(buckets)
+            count = sum(buckets.values())
+            histograms[name] = {
+                "count": count,
+                "sum": self._sums[name],
+                "mean": self._sums[name] / count,
+                "max": self._maxima[name],
+                "lower_bounds": [1 << (b - 1) if b > 0 else 0 for b in bits],
+                "counts": [buckets[b] for b in bits]}
+        if path is not None:
+            with open(path, "w") as f:
+                json.dump({"steps": self.steps, "histograms": histograms}, f, indent=2)
+        return histograms
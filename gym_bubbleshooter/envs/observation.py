@@ -0,0 +1,83 @@
+import numpy as np
+from gym import spaces
+
+
+class ObservationEncoder():
+    """
+    Writes the game state into preallocated buffers.
+
+    The board is encoded in one of these formats, where len(colors)
+    marks an empty cell:
+
+    - "flat": a uint8 vector with a color index for every cell.
+    - "grid": a uint8 array of shape (height, width) with a color index for every cell.
+    - "onehot": uint8 planes of shape (len(colors) + 1, height, width),
+      one for every color and the last one for empty cells.
+
+    With batch set to N, all arrays get a leading dimension of size N.
+    With view set, encode returns the same dictionary with the buffers on
+    every call, which are overwritten by the next call, instead of copies.
+    """
+    formats = ("flat", "grid", "onehot")
+
+    def __init__(self, array_height, array_width, colors, format="flat", view=False, batch=None):
+        if format not in self.formats:
+            raise ValueError("Unsupported observation format: {}".format(format))
+        self.array_height = array_height
+        self.array_width = array_width
+        self.colors = colors
+        self.format = format
+        self.view = view
+        self.batch = batch
+        leading = () if batch is None else (batch,)
+
+        if format == "flat":
+            self.shape = (array_height * array_width,)
+        elif format == "grid":
+            self.shape = (array_height, array_width)
+        else:
+            self.shape = (colors + 1, array_height, array_width)
+            self._levels = np.arange(colors + 1, dtype=np.uint8).reshape(-1, 1, 1)
+        # onehot planes are written as booleans and returned as uint8
+        self._board = np.zeros(leading + self.shape,
+                               dtype=np.bool_ if format == "onehot" else np.uint8)
+        self._state = {"next_bubble": 0, "board": self._board.view(np.uint8)}
+        if batch is not None:
+            self._state["next_bubble"] = np.zeros(batch, dtype=np.uint8)
+
+    def space(self):
+        """
+        Returns the observation space of the encoded game states.
+        """
+        if self.batch is None:
+            next_bubble = spaces.Discrete(self.colors)
+            if self.format == "onehot":
+                board = spaces.Box(0, 1, self.shape, dtype=np.uint8)
+            else:
+                board = spaces.MultiDiscrete(np.full(self.shape, self.colors + 1))
+        else:
+            next_bubble = spaces.MultiDiscrete([self.colors] * self.batch)
+            high = 1 if self.format == "onehot" else self.colors
+            board = spaces.Box(0, high, (self.batch,) + self.shape, dtype=np.uint8)
+        return spaces.Dict({"next_bubble": next_bubble, "board": board})
+
+    def encode(self, grid, next_bubble):
+        """
+        Encodes the given color grid, or grids of shape (N, height, width)
+        with batch, and the color index of the next bubble.
+        """
+        if self.format == "onehot":
+            np.equal(grid[..., None, :, :], self._levels, out=self._board)
+        else:
+            np.copyto(self._board, grid.reshape(self._board.shape))
+        if self.batch is None:
+            self._state["next_bubble"] = int(next_bubble)
+        else:
+            self._state["next_bubble"][:] = next_bubble
+        if self.view:
+            return self._state
+        state = {"next_bubble": self._state["next_bubble"],
+                 "board": self._state["board"].copy()}
+        if self.batch is not None:
+            state["next_bubble"] = state["next_bubble"].copy()
+        return state
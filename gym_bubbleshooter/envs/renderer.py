@@ -0,0 +1,304 @@
+import queue
+import threading
+import numpy as np
+from gym import error
+from gym_bubbleshooter.envs import trajectory
+
+
+class RgbArrayRenderer():
+    """
+    Draws the game board into a reusable uint8 frame buffer with NumPy,
+    without pygame or a display.
+
+    Every bubble is a prerendered disc of pixel indices at the center of
+    its cell, scaled by the given factor. Only the cells that changed
+    since the last frame are drawn again. At small scales the discs of
+    neighboring cells can share pixels, then the neighbors of the changed
+    cells are drawn again on those pixels as well.
+    """
+    background = (255, 255, 255)
+
+    def __init__(self, geometry, colors, scale=1.0, grayscale=False):
+        self.height = int(round(geometry.window_height * scale))
+        self.width = int(round(geometry.window_width * scale))
+        self.grayscale = grayscale
+
+        # the last entry of the palette is the color of an empty cell
+        palette = np.array(list(colors) + [self.background], dtype=np.float64)
+        if grayscale:
+            palette = (palette @ [0.299, 0.587, 0.114])[:, None]
+        self.palette = np.rint(palette).astype(np.uint8)
+
+        # the frame is padded by one radius, so discs never leave the buffer
+        radius = geometry.bubble_radius * scale
+        self._padding = int(np.ceil(radius))
+        width = self.width + 2 * self._padding
+        self._buffer = np.empty((self.height + 2 * self._padding, width,
+                                 self.palette.shape[1]), dtype=np.uint8)
+        self._buffer[:] = self.palette[-1]
+        self.frame = self._buffer[self._padding:self._padding + self.height,
+                                  self._padding:self._padding + self.width]
+
+        dy, dx = np.mgrid[-self._padding:self._padding + 1,
+                          -self._padding:self._padding + 1]
+        disc = dy * dy + dx * dx <= radius * radius
+        self._disc = dy[disc] * width + dx[disc]
+        self._pixels = self._center(geometry.centers_x, geometry.centers_y, scale).ravel()[:, None] \
+            + self._disc
+        self._start = self._center(geometry.start_x, geometry.start_y, scale) + self._disc
+        self._overlaps = self._overlapping_cells()
+        # marks the pixels that are drawn again, see _redraw
+        self._affected = np.zeros(self._buffer.shape[0] * width, dtype=bool)
+
+        self._drawn = np.full(geometry.array_height * geometry.array_width,
+                              len(colors), dtype=np.uint8)
+        self._drawn_next = len(colors)
+
+    def render(self, grid, next_color):
+        """
+        Draws the color grid and the next bubble at the shooting position
+        and returns a copy of the frame, of shape (height, width, 3)
+        or (height, width) if grayscale.
+        """
+        cells = grid.ravel()
+        changed = np.flatnonzero(cells != self._drawn)
+        pixels = self._buffer.reshape(-1, self.palette.shape[1])
+        if len(changed) > 0 and self._overlaps is not None:
+            self._redraw(pixels, cells, changed)
+        elif len(changed) > 0:
+            pixels[self._pixels[changed]] = self.palette[cells[changed], None]
+        self._drawn[changed] = cells[changed]
+        if next_color != self._drawn_next:
+            pixels[self._start] = self.palette[next_color]
+            self._drawn_next = next_color
+        if self.grayscale:
+            return self.frame[:, :, 0].copy()
+        return self.frame.copy()
+
+    def _redraw(self, pixels, cells, changed):
+        """
+        Draws the pixels of the discs of the changed cells again, like a
+        new frame: the background and then all bubbles on these pixels
+        ordered by their cells, so the last cell wins where discs overlap.
+        """
+        affected = self._pixels[changed].ravel()
+        self._affected[affected] = True
+        pixels[affected] = self.palette[-1]
+        redrawn = set(changed.tolist())
+        for cell in changed.tolist():
+            redrawn.update(self._overlaps[cell])
+        empty = len(self.palette) - 1
+        for cell in sorted(redrawn):
+            if cells[cell] != empty:
+                disc = self._pixels[cell]
+                pixels[disc[self._affected[disc]]] = self.palette[cells[cell]]
+        self._affected[affected] = False
+
+    def _overlapping_cells(self):
+        """
+        Returns the cells whose discs share pixels with the disc of every
+        cell, or None if no discs overlap.
+        """
+        pixels = self._pixels.ravel()
+        owners = np.repeat(np.arange(len(self._pixels)), self._pixels.shape[1])
+        order = np.argsort(pixels, kind="stable")
+        pixels, owners = pixels[order], owners[order]
+        # runs of the same pixel in more than one disc
+        starts = np.flatnonzero(np.r_[True, pixels[1:] != pixels[:-1]])
+        ends = np.r_[starts[1:], len(pixels)]
+        shared = ends - starts > 1
+        if not shared.any():
+            return None
+        overlaps = [set() for _ in range(len(self._pixels))]
+        for start, end in zip(starts[shared].tolist(), ends[shared].tolist()):
+            group = owners[start:end].tolist()
+            for cell in group:
+                overlaps[cell].update(group)
+        return overlaps
+
+    def _center(self, x, y, scale):
+        """
+        Returns the flat buffer index of the pixel at the given position.
+        """
+        x = np.rint(np.asarray(x) * scale).astype(np.int64) + self._padding
+        y = np.rint(np.asarray(y) * scale).astype(np.int64) + self._padding
+        return y * (self.width + 2 * self._padding) + x
+
+
+class HumanRenderer():
+    """
+    Shows the game in a pygame window and animates the shots.
+
+    Only the rectangles of the flying bubble and of the cells that changed
+    are drawn again. The path of a shot is subsampled to the frame rate,
+    so a shot takes its length divided by the velocity in pixels per
+    second, and the pygame events are processed on every frame to keep
+    the window responsive.
+
+    With threaded set, the window is drawn by a background thread that is
+    fed by a queue of at most queue_size shots. If the queue is full, the
+    oldest shot is dropped, so show never waits for the animation.
+    """
+    background = (255, 255, 255)
+    unknown = 255  # color index of a cell that has to be drawn again
+
+    def __init__(self, geometry, colors, fps=60, velocity=2000, threaded=False, queue_size=8):
+        try:
+            import pygame
+            import pygame.gfxdraw
+        except ImportError as e:
+            raise error.DependencyNotInstalled(
+                "{}. (HINT: install pygame using `pip install pygame`".format(e))
+        self._pygame = pygame
+        self.geometry = geometry
+        self.colors = list(colors) + [self.background]
+        self.fps = fps
+        self.velocity = velocity
+        self.closed = False
+        self._screen = None
+        self._drawn = np.full((geometry.array_height, geometry.array_width),
+                              len(colors), dtype=np.uint8)
+        self._drawn_next = len(colors)
+        self._thread = None
+        if threaded:
+            self._queue = queue.Queue(queue_size)
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def show(self, before, after, path, speed, color, next_color):
+        """
+        Animates a shot of the given color index along a path returned by
+        trajectory.cast from the color grid before to the color grid after it,
+        and shows the next bubble at the shooting position.
+        """
+        if self.closed:
+            return
+        shot = (before, after, path, speed, color, next_color)
+        if self._thread is None:
+            self._draw(shot)
+        else:
+            self._put(shot)
+
+    def close(self):
+        """
+        Closes the window, after the queued shots are shown if threaded.
+        """
+        if self._thread is not None:
+            self._put(None)
+            self._thread.join()
+            self._thread = None
+        else:
+            self._quit()
+
+    def _put(self, item):
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def _run(self):
+        # the display is owned by this thread from the start
+        while True:
+            try:
+                shot = self._queue.get(timeout=1 / self.fps)
+            except queue.Empty:
+                self._pump()
+                continue
+            if shot is None:
+                break
+            self._draw(shot)
+        self._quit()
+
+    def _open(self):
+        pygame = self._pygame
+        pygame.init()
+        self._screen = pygame.display.set_mode(
+            (round(self.geometry.window_width), round(self.geometry.window_height)))
+        self._screen.fill(self.background)
+        pygame.display.update()
+        self._clock = pygame.time.Clock()
+
+    def _quit(self):
+        if self._screen is not None:
+            self._pygame.display.quit()
+            self._screen = None
+        self.closed = True
+
+    def _pump(self):
+        """
+        Processes the pending window events and closes the window on quit.
+        """
+        if self._screen is None:
+            return
+        for event in self._pygame.event.get():
+            if event.type == self._pygame.QUIT:
+                self._quit()
+
+    def _draw(self, shot):
+        if self._screen is None:
+            if self.closed:
+                return
+            self._open()
+        before, after, path, speed, color, next_color = shot
+        geometry = self.geometry
+        rects = self._draw_cells(before)
+
+        # subsample the path to one position per frame
+        positions = trajectory.sample_path(path, speed)
+        if positions:
+            stride = max(1, round(self.velocity / self.fps / speed))
+            positions = positions[stride - 1::stride] + [positions[-1]]
+            # the flying bubble starts at the shooting position
+            self._drawn_next = len(self.colors) - 1
+            previous = (geometry.start_x, geometry.start_y)
+            for position in positions:
+                rects.append(self._draw_bubble(previous, self.background))
+                rects.append(self._draw_bubble(position, self.colors[color]))
+                previous = position
+                self._update(rects)
+                if self._screen is None:
+                    return
+                self._clock.tick(self.fps)
+                rects = []
+            rects.append(self._draw_bubble(previous, self.background))
+            # erasing the bubble may have touched the cells around it,
+            # which are drawn again
+            touched = (geometry.centers_x - previous[0])**2 \
+                + (geometry.centers_y - previous[1])**2 \
+                <= (2 * geometry.bubble_radius + 2)**2
+            self._drawn[touched] = self.unknown
+
+        rects.extend(self._draw_cells(after))
+        if next_color != self._drawn_next:
+            rects.append(self._draw_bubble(
+                (geometry.start_x, geometry.start_y), self.colors[next_color]))
+            self._drawn_next = next_color
+        self._update(rects)
+
+    def _draw_cells(self, grid):
+        """
+        Draws the cells of the grid that differ from the window
+        and returns their rectangles.
+        """
+        rects = []
+        for row, column in np.argwhere(grid != self._drawn):
+            rects.append(self._draw_bubble(
+                (self.geometry.centers_x[row, column], self.geometry.centers_y[row, column]),
+                self.colors[grid[row, column]]))
+        self._drawn[:] = grid
+        return rects
+
+    def _draw_bubble(self, position, color):
+        x, y = round(position[0]), round(position[1])
+        radius = self.geometry.bubble_radius
+        self._pygame.gfxdraw.filled_circle(self._screen, x, y, radius, color)
+        return self._pygame.Rect(x - radius, y - radius, 2 * radius + 1, 2 * radius + 1)
+
+    def _update(self, rects):
+        self._pygame.display.update(rects)
+        self._pump()
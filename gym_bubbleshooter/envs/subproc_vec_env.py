@@ -0,0 +1,328 @@
+import functools
+import multiprocessing
+import numpy as np
+import sys
+import random
+from gym import spaces
+from multiprocessing import shared_memory
+from gym_bubbleshooter.envs.bubbleshooter_env import BubbleShooterEnv
+
+
+def _attach(specs, blocks):
+    """
+    Returns numpy arrays for the given (name, shape, dtype) specs
+    backed by the given shared memory blocks.
+    """
+    arrays = {}
+    for (name, shape, dtype), block in zip(specs, blocks):
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    return arrays
+
+
+def _write_state(arrays, index, env):
+    arrays["next_bubble"][index] = env.color_dictionary[env.next_bubble.color]
+    arrays["board"][index] = env.grid.ravel()
+
+
+def _state_specs(num_envs, size):
+    """
+    Returns the (name, shape, dtype) specs of the shared game states,
+    rewards and dones of num_envs environments with size cells.
+    """
+    return [("next_bubble", (num_envs,), np.uint8),
+            ("board", (num_envs, size), np.uint8),
+            ("terminal_board", (num_envs, size), np.uint8),
+            ("rewards", (num_envs,), np.float64),
+            ("dones", (num_envs,), np.bool_)]
+
+
+def _check_env_kwargs(env_kwargs):
+    """
+    Returns the keyword arguments of the BubbleShooterEnvs of the workers
+    and an environment of this configuration, which checks it before any
+    worker is started.
+
+    The game states are always written as flat color grids,
+    so observation_format and observation_view are not accepted.
+    """
+    env_kwargs = dict(env_kwargs or {})
+    formats = {"observation_format", "observation_view"}.intersection(env_kwargs)
+    if formats:
+        raise ValueError("The game states are always written as flat color grids, "
+                         "{} can not be set".format(", ".join(sorted(formats))))
+    return env_kwargs, BubbleShooterEnv(seed=0, **env_kwargs)
+
+
+def _run_worker(serve, connection, parent_connection, specs, names, seeds, env_kwargs):
+    """
+    The main function of a worker process, that attaches the shared memory,
+    creates the BubbleShooterEnvs of the given seeds and runs
+    serve(connection, arrays, envs) until it returns. An exception is sent
+    to the parent, after which the worker stops.
+    """
+    parent_connection.close()
+    blocks = [shared_memory.SharedMemory(name=name) for name in names]
+    arrays = _attach(specs, blocks)
+    try:
+        envs = [BubbleShooterEnv(seed=int(seed), **env_kwargs) for seed in seeds]
+        serve(connection, arrays, envs)
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        connection.send(e)
+    finally:
+        del arrays
+        for block in blocks:
+            block.close()
+        connection.close()
+
+
+def _serve(offset, connection, arrays, envs):
+    """
+    Steps or resets all environments of the worker, whose first index is
+    offset, on every command and reports None when they are done.
+    """
+    while True:
+        command = connection.recv()
+        if command == "step":
+            for index, env in enumerate(envs, offset):
+                _, reward, done, _ = env.step(int(arrays["actions"][index]))
+                arrays["rewards"][index] = reward
+                arrays["dones"][index] = done
+                if done:
+                    arrays["terminal_board"][index] = env.grid.ravel()
+                    env.reset()
+                _write_state(arrays, index, env)
+            connection.send(None)
+        elif command == "reset":
+            for index, env in enumerate(envs, offset):
+                env.reset()
+                _write_state(arrays, index, env)
+            connection.send(None)
+        elif command == "close":
+            break
+
+
+class _WorkerGroup():
+    """
+    The shared memory and the worker processes of
+    BubbleShooterSubprocVecEnv and BubbleShooterEnvPool.
+
+    Workers receive commands through their connection and send back
+    messages, or an exception after which they stop. The connections
+    of workers that stopped are kept in dead.
+    """
+
+    def __init__(self, specs, context=None):
+        self.specs = specs
+        self.blocks = [shared_memory.SharedMemory(
+            create=True, size=max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize))
+            for _, shape, dtype in specs]
+        self.arrays = _attach(specs, self.blocks)
+        self.context = multiprocessing.get_context(context)
+        self.connections = []
+        self.processes = []
+        self.dead = set()
+
+    def start(self, serve, seeds, env_kwargs):
+        """
+        Starts a worker process with the environments of the given seeds,
+        that runs serve, see _run_worker, and returns its connection.
+        """
+        connection, worker_connection = self.context.Pipe()
+        process = self.context.Process(
+            target=_run_worker, daemon=True,
+            args=(serve, worker_connection, connection, self.specs,
+                  [block.name for block in self.blocks], seeds, env_kwargs))
+        process.start()
+        worker_connection.close()
+        self.connections.append(connection)
+        self.processes.append(process)
+        return connection
+
+    def receive(self, connection):
+        """
+        Returns the next message of the worker of the connection, or an
+        exception if it failed or stopped without reporting an error.
+        """
+        try:
+            message = connection.recv()
+        except (EOFError, OSError):
+            worker = self.connections.index(connection)
+            message = Exception("Worker process {} (pid {}) stopped unexpectedly".format(
+                worker, self.processes[worker].pid))
+        if isinstance(message, Exception):
+            # the worker stops after reporting an error
+            self.dead.add(connection)
+        return message
+
+    def close(self):
+        """
+        Stops all workers that are still running and frees the shared memory.
+        """
+        try:
+            for connection in self.connections:
+                if connection not in self.dead:
+                    try:
+                        connection.send("close")
+                    except OSError:
+                        self.dead.add(connection)
+            for process in self.processes:
+                process.join()
+            for connection in self.connections:
+                connection.close()
+        finally:
+            self.arrays = None
+            for block in self.blocks:
+                block.close()
+                block.unlink()
+
+
+class BubbleShooterSubprocVecEnv():
+    """
+    Steps BubbleShooterEnvs in worker processes, with envs_per_worker
+    environments in every process.
+
+    The workers write the game states, rewards and dones straight into
+    shared memory, only short commands are sent through the pipes.
+    The seed of every environment is derived from the given seed.
+    """
+
+    def __init__(self, num_envs=8, envs_per_worker=1, seed=None, copy=True, context=None,
+                 env_kwargs=None):
+        """
+        Parameters
+        ----------
+        num_envs : int
+            The number of environments.
+        envs_per_worker : int
+            The number of environments stepped by every worker process.
+        seed : int
+            The seed from which the seeds of all environments are derived.
+        copy : bool
+            If false, step_wait and reset return views on the shared memory,
+            that are only valid until the next call of step_send.
+        context : str
+            The multiprocessing start method, the default if None.
+        env_kwargs : dict
+            The keyword arguments of every BubbleShooterEnv,
+            like the configuration of the board. The game states are
+            always flat color grids, so observation_format and
+            observation_view are not accepted.
+        """
+        self.num_envs = num_envs
+        self.seed = seed
+        if seed is None:
+            self.seed = random.randint(0, sys.maxsize)
+        self.copy = copy
+        self.waiting = False
+
+        env_kwargs, prototype = _check_env_kwargs(env_kwargs)
+        size = prototype.array_height * prototype.array_width
+        colors = len(prototype.colors)
+        self.action_space = spaces.MultiDiscrete([179] * num_envs)
+        self.observation_space = spaces.Dict({
+            "next_bubble": spaces.MultiDiscrete([colors] * num_envs),
+            "board": spaces.Box(0, colors, (num_envs, size), dtype=np.uint8)})
+        self._workers = _WorkerGroup(
+            [("actions", (num_envs,), np.int64)] + _state_specs(num_envs, size), context)
+        self._arrays = self._workers.arrays
+        self.closed = False
+
+        offsets = range(0, num_envs, envs_per_worker)
+        sequences = np.random.SeedSequence(self.seed).spawn(len(offsets))
+        for offset, sequence in zip(offsets, sequences):
+            count = min(envs_per_worker, num_envs - offset)
+            self._workers.start(functools.partial(_serve, offset),
+                                sequence.generate_state(count, np.uint64), env_kwargs)
+
+    def reset(self):
+        """
+        Resets all environments and returns the stacked game states.
+        """
+        self._send("reset")
+        self._receive()
+        return self._get_game_state()
+
+    def step_send(self, actions):
+        """
+        Starts stepping all environments with the given actions
+        of shape (num_envs,) and returns immediately.
+        """
+        if self.waiting:
+            raise Exception("step_wait has to be called before the next step_send")
+        self._arrays["actions"][:] = actions
+        self._send("step")
+        self.waiting = True
+
+    def step_wait(self):
+        """
+        Waits for the step started by step_send.
+
+        Returns
+        -------
+        ob, reward, episode_over, info : tuple
+            like BubbleShooterVecEnv.step, environments whose game
+            is over are reset automatically.
+        """
+        if not self.waiting:
+            raise Exception("step_send has to be called before step_wait")
+        try:
+            self._receive()
+        finally:
+            self.waiting = False
+        rewards = self._arrays["rewards"]
+        dones = self._arrays["dones"]
+        info = {}
+        if dones.any():
+            info["terminal_board"] = self._arrays["terminal_board"].copy()
+        if self.copy:
+            rewards, dones = rewards.copy(), dones.copy()
+        return self._get_game_state(), rewards, dones, info
+
+    def step(self, actions):
+        """
+        Steps all environments with the given actions of shape (num_envs,).
+        """
+        self.step_send(actions)
+        return self.step_wait()
+
+    def close(self):
+        """
+        Stops all workers and frees the shared memory.
+        """
+        if self.closed:
+            return
+        try:
+            if self.waiting:
+                self.waiting = False
+                self._receive()
+        finally:
+            self._arrays = None
+            self._workers.close()
+            self.closed = True
+
+    def __del__(self):
+        if not getattr(self, "closed", True):
+            self.close()
+
+    def _send(self, command):
+        if self._workers.dead:
+            raise Exception("Worker processes stopped, the environment has to be closed")
+        for connection in self._workers.connections:
+            connection.send(command)
+
+    def _receive(self):
+        errors = [self._workers.receive(connection) for connection in self._workers.connections
+                  if connection not in self._workers.dead]
+        for e in errors:
+            if e is not None:
+                raise e
+
+    def _get_game_state(self):
+        state = {}
+        state["next_bubble"] = self._arrays["next_bubble"]
+        state["board"] = self._arrays["board"]
+        if self.copy:
+            state = {key: value.copy() for key, value in state.items()}
+        return state
@@ -0,0 +1,258 @@
+import functools
+import math
+import numpy as np
+
+
+def direction(angle, speed):
+    """
+    Returns the movement in x- and y-direction of one step
+    of a bubble shot at the given angle.
+    """
+    if angle == 90:
+        return 0, speed * -1
+    elif angle < 90:
+        return (math.cos(math.radians(angle)) * speed * -1,
+                math.sin(math.radians(angle)) * speed * -1)
+    else:
+        return (math.cos(math.radians(180 - angle)) * speed,
+                math.sin(math.radians(180 - angle)) * speed * -1)
+
+
+@functools.lru_cache(maxsize=None)
+def _direction_table(speed):
+    """
+    Returns the movement of one step for all angles as an array of shape (180, 2).
+    """
+    table = np.zeros((180, 2))
+    for angle in range(1, 180):
+        table[angle] = direction(angle, speed)
+    return table
+
+
+def _first_step(start, step, bound):
+    """
+    Returns the first step k >= 1 for which start + k * step <= bound,
+    given a negative step.
+    """
+    k = max(1, math.ceil((start - bound) / -step))
+    # correct rounding errors of the division
+    while k > 1 and start + (k - 1) * step <= bound:
+        k -= 1
+    while start + k * step > bound:
+        k += 1
+    return k
+
+
+def _first_contact(x, y, xmove, ymove, centers_x, centers_y, radius):
+    """
+    Returns the first step k >= 1 at which a bubble moving from (x, y)
+    overlaps one of the given bubbles, or math.inf if it never does.
+    """
+    if len(centers_x) == 0:
+        return math.inf
+    # solve |(x, y) + t * (xmove, ymove) - center| = 2 * radius for t
+    fx = x - centers_x
+    fy = y - centers_y
+    a = xmove * xmove + ymove * ymove
+    b = 2 * (fx * xmove + fy * ymove)
+    c = fx * fx + fy * fy - (2 * radius) ** 2
+    discriminant = b * b - 4 * a * c
+    hit = discriminant > 0
+    if not hit.any():
+        return math.inf
+    fx, fy, b = fx[hit], fy[hit], b[hit]
+    t = (-b - np.sqrt(discriminant[hit])) / (2 * a)
+
+    # the bubble only stops at whole steps, so test the steps around the
+    # entry point with the same distance check the stepping used
+    first = np.maximum(np.floor(t) + 1, 1)
+    best = math.inf
+    for k in (first - 1, first, first + 1):
+        inside = (k >= 1) & (np.sqrt((fx + k * xmove) ** 2
+                                     + (fy + k * ymove) ** 2) - radius * 2 < 0)
+        if inside.any():
+            best = min(best, k[inside].min())
+    return best
+
+
+def cast(x, y, angle, centers_x, centers_y, radius, spacing, width, speed, path=None,
+         stats=None):
+    """
+    Calculates where a bubble shot from (x, y) at the given angle stops.
+
+    The bubble moves in steps of the given speed and is reflected at the
+    side walls. It stops at the first step where it touches the top or
+    overlaps one of the bubbles given by their centers. Instead of moving
+    the bubble step by step, the first wall bounce and the first contact
+    are solved in closed form for every straight segment of the path.
+
+    If a list is given as path, the start, all wall bounces and the end
+    of the trajectory are appended to it as (x, y, angle) tuples.
+
+    If a dictionary is given as stats, the number of straight segments,
+    wall bounces, steps of the given speed and bubbles tested for a contact
+    are added to "trajectory_segments", "wall_bounces", "trajectory_steps"
+    and "collision_checks".
+
+    Returns
+    -------
+    x, y : tuple
+        the position at which the bubble stopped.
+    """
+    centers_x = np.asarray(centers_x, dtype=float)
+    centers_y = np.asarray(centers_y, dtype=float)
+    table = _direction_table(speed)
+    # segments that stay below this height cannot touch any bubble
+    lowest = centers_y.max() + 2 * radius + 1 if len(centers_y) > 0 else -math.inf
+    if path is not None:
+        path.append((x, y, angle))
+    while True:
+        xmove, ymove = table[angle]
+        stop = _first_step(y, ymove, spacing + radius)
+        if xmove < 0:
+            bounce = _first_step(x, xmove, spacing + radius)
+        elif xmove > 0:
+            bounce = _first_step(-x, -xmove, radius + spacing - width)
+        else:
+            bounce = math.inf
+        if y + min(stop, bounce) * ymove < lowest:
+            stop = min(stop, _first_contact(x, y, xmove, ymove,
+                                            centers_x, centers_y, radius))
+            if stats is not None:
+                stats["collision_checks"] += len(centers_x)
+        if stats is not None:
+            stats["trajectory_segments"] += 1
+            stats["trajectory_steps"] += int(min(stop, bounce))
+        if stop <= bounce:
+            x, y = x + stop * xmove, y + stop * ymove
+            if path is not None:
+                path.append((x, y, angle))
+            return x, y
+        if stats is not None:
+            stats["wall_bounces"] += 1
+        x, y = x + bounce * xmove, y + bounce * ymove
+        angle = 180 - angle
+        if path is not None:
+            path.append((x, y, angle))
+
+
+def _first_steps(start, step, bound):
+    """
+    Vectorized version of _first_step for arrays of starts and negative steps.
+    """
+    k = np.maximum(1, np.ceil((start - bound) / -step))
+    # correct rounding errors of the division
+    k = np.where((k > 1) & (start + (k - 1) * step <= bound), k - 1, k)
+    return np.where(start + k * step > bound, k + 1, k)
+
+
+def cast_batch(x, y, angles, occupied, centers_x, centers_y,
+               radius, spacing, width, speed, segments=None):
+    """
+    Calculates where bubbles shot on several boards stop.
+
+    Works like cast, but for N shots at once. The shots are given by
+    arrays of shape (N,) for their start positions and angles, the boards
+    by a boolean array of shape (N, C) that marks which of the C cells
+    with the given centers are occupied.
+
+    If a list is given as segments, the straight segments of all
+    trajectories are appended to it as tuples of arrays
+    (shots, start_x, start_y, end_x, end_y).
+
+    Returns
+    -------
+    x, y : tuple
+        arrays of shape (N,) with the positions at which the bubbles stopped.
+    """
+    x = np.array(x, dtype=float)
+    y = np.array(y, dtype=float)
+    angles = np.array(angles, dtype=np.int64)
+    occupied = np.asarray(occupied, dtype=bool)
+    centers_x = np.asarray(centers_x, dtype=float).ravel()
+    centers_y = np.asarray(centers_y, dtype=float).ravel()
+    table = _direction_table(speed)
+
+    active = np.arange(len(x))
+    while len(active) > 0:
+        if len(active) <= 8:
+            # finish the last shots, usually long bank shots, one by one
+            for shot in active:
+                path = [] if segments is not None else None
+                x[shot], y[shot] = cast(
+                    x[shot], y[shot], angles[shot], centers_x[occupied[shot]],
+                    centers_y[occupied[shot]], radius, spacing, width, speed, path)
+                if segments is not None:
+                    points = np.array(path)[:, :2]
+                    segments.append((np.full(len(points) - 1, shot),
+                                     *points[:-1].T, *points[1:].T))
+            break
+        xmove, ymove = table[angles[active]].T
+        sx, sy = x[active], y[active]
+        stop = _first_steps(sy, ymove, spacing + radius)
+        bounce = np.full(len(active), np.inf)
+        left = xmove < 0
+        right = xmove > 0
+        bounce[left] = _first_steps(sx[left], xmove[left], spacing + radius)
+        bounce[right] = _first_steps(-sx[right], -xmove[right],
+                                     radius + spacing - width)
+
+        # first contact with a bubble, see _first_contact, only solved for
+        # segments that get close enough to the lowest bubble and for the
+        # pairs of shots and bubbles whose line of flight meets
+        near = np.flatnonzero(occupied[active].any(axis=1))
+        if len(near) > 0:
+            lowest = centers_y[occupied[active[near]].any(axis=0)].max()
+            end_y = sy[near] + np.minimum(stop[near], bounce[near]) * ymove[near]
+            near = near[end_y < lowest + 2 * radius + 1]
+        if len(near) > 0:
+            board = occupied[active[near]]
+            cells = np.flatnonzero(board.any(axis=0))
+            near_xmove, near_ymove = xmove[near], ymove[near]
+            fx = sx[near, None] - centers_x[cells]
+            fy = sy[near, None] - centers_y[cells]
+            a = near_xmove * near_xmove + near_ymove * near_ymove
+            b = 2 * (fx * near_xmove[:, None] + fy * near_ymove[:, None])
+            c = fx * fx + fy * fy - (2 * radius) ** 2
+            discriminant = b * b - 4 * a[:, None] * c
+            shots, hits = np.nonzero(board[:, cells] & (discriminant > 0))
+        else:
+            shots = near
+        if len(shots) > 0:
+            fx, fy = fx[shots, hits], fy[shots, hits]
+            shot_xmove, shot_ymove = near_xmove[shots], near_ymove[shots]
+            t = (-b[shots, hits] - np.sqrt(discriminant[shots, hits])) / (2 * a[shots])
+            first = np.maximum(np.floor(t) + 1, 1)
+            contact = np.full(len(shots), np.inf)
+            for k in (first + 1, first, first - 1):
+                inside = (k >= 1) & (np.sqrt((fx + k * shot_xmove) ** 2
+                                             + (fy + k * shot_ymove) ** 2) - radius * 2 < 0)
+                contact = np.where(inside, k, contact)
+            # the pairs are sorted by shot, so reduce every run of a shot
+            starts = np.flatnonzero(np.r_[True, shots[1:] != shots[:-1]])
+            shots = near[shots[starts]]
+            stop[shots] = np.minimum(stop[shots], np.minimum.reduceat(contact, starts))
+
+        done = stop <= bounce
+        steps = np.where(done, stop, bounce)
+        x[active] = sx + steps * xmove
+        y[active] = sy + steps * ymove
+        if segments is not None:
+            segments.append((active, sx, sy, x[active], y[active]))
+        angles[active[~done]] = 180 - angles[active[~done]]
+        active = active[~done]
+    return x, y
+
+
+def sample_path(path, speed):
+    """
+    Returns the position of the bubble after every step
+    along a path returned by cast.
+    """
+    positions = []
+    for (x, y, angle), (end_x, end_y, _) in zip(path, path[1:]):
+        xmove, ymove = direction(angle, speed)
+        steps = max(1, round(abs(end_y - y) / abs(ymove)))
+        for k in range(1, steps + 1):
+            positions.append((x + k * xmove, y + k * ymove))
+    return positions
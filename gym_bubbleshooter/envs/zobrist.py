@@ -0,0 +1,150 @@
+import collections
+import functools
+import numpy as np
+
+
+class ZobristKeys():
+    """
+    Random 64 bit keys for the Zobrist hash of a game state, which is
+    the xor of the key of the color of every bubble on the board and the
+    key of the color of the next bubble.
+
+    The keys are drawn from a generator seeded with the board size, so
+    the hashes are the same in every process and run. As a bubble is
+    added or removed by xor-ing its key, the hash is updated in place
+    while the board changes.
+
+    Use ZobristKeys.cached to share the keys between all environments
+    with the same board size and number of colors.
+    """
+
+    def __init__(self, array_height, array_width, colors):
+        self.array_height = array_height
+        self.array_width = array_width
+        self.colors = colors
+        random_generator = np.random.Generator(np.random.PCG64(
+            [array_height, array_width, colors]))
+        # the key of every color of every cell, 0 for the empty color
+        self.board_keys = np.zeros((array_height * array_width, colors + 1), dtype=np.uint64)
+        self.board_keys[:, :colors] = random_generator.integers(
+            0, 2**64, (array_height * array_width, colors), dtype=np.uint64)
+        self.next_keys = random_generator.integers(
+            0, 2**64, colors, dtype=np.uint64)
+        # flat lists of ints, which are faster to index than arrays
+        self._board_keys = self.board_keys.ravel().tolist()
+        self._next_keys = self.next_keys.tolist()
+
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def cached(cls, array_height, array_width, colors):
+        """
+        Returns the shared, read-only keys of the given board size and colors.
+        """
+        keys = cls(array_height, array_width, colors)
+        keys.board_keys.flags.writeable = False
+        keys.next_keys.flags.writeable = False
+        return keys
+
+    def key(self, cell, color):
+        """
+        Returns the key of a bubble of the given color index in the
+        given cell (flat index of the grid), 0 for the empty color.
+        """
+        return self._board_keys[cell * (self.colors + 1) + color]
+
+    def next_key(self, color):
+        """
+        Returns the key of the given color index of the next bubble.
+        """
+        return self._next_keys[color]
+
+    def board_hash(self, grid):
+        """
+        Returns the hash of the bubbles on the color grid as an int.
+        """
+        cells = np.arange(self.board_keys.shape[0])
+        return int(np.bitwise_xor.reduce(self.board_keys[cells, np.ravel(grid)]))
+
+    def hashes(self, boards, next_colors):
+        """
+        Returns the hashes of a batch of game states as an array of uint64,
+        given the color grids of shape (n, array_height * array_width)
+        or (n, array_height, array_width) and the next colors of shape (n,).
+        """
+        boards = np.asarray(boards).reshape(len(boards), -1)
+        cells = np.arange(boards.shape[1])
+        return (np.bitwise_xor.reduce(self.board_keys[cells, boards], axis=1)
+                ^ self.next_keys[np.asarray(next_colors)])
+
+
+class TranspositionTable():
+    """
+    A bounded table of values and visit counts of game states by their
+    hash, for example to share the statistics of a search between all
+    action orders that reach the same state.
+
+    When the table is full, the least recently used state is dropped.
+    Any hashable key can be used, like the hash of a state together with
+    an action.
+    """
+
+    def __init__(self, capacity=2**20):
+        if capacity < 1:
+            raise ValueError("capacity has to be at least 1")
+        self.capacity = capacity
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def lookup(self, key):
+        """
+        Returns the value and the visit count of the given key,
+        or None if it is not in the table.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[0], entry[1]
+
+    def store(self, key, value, visits=1):
+        """
+        Sets the value and the visit count of the given key.
+        """
+        self._entries[key] = [value, visits]
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def update(self, key, value):
+        """
+        Adds a visit with the given value to the key, whose value is the
+        mean of the values of all its visits, and returns the new mean.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.store(key, value)
+            return value
+        entry[1] += 1
+        entry[0] += (value - entry[0]) / entry[1]
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def add(self, key):
+        """
+        Adds the key with a visit and no value if it is new and returns
+        whether it was new, which deduplicates a stream of states.
+        """
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self._entries[key][1] += 1
+            return False
+        self.store(key, None)
+        return True
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,236 @@
+"""
+Evaluates a policy on many episodes of BubbleShooterEnv, one episode for
+every seed of a fixed list, spread over a pool of worker processes that
+run the episodes headless.
+
+The summary of every episode is written to the results file as a line
+of JSON as soon as it is finished, followed by the aggregate statistics.
+
+Usage: bubbleshooter-eval [--policy package.module:policy] [--episodes 100]
+                          [--first-seed 0 | --seeds 1 2 3] [--workers N]
+                          [--output results.jsonl] [--env-kwargs '{"num_colors": 5}']
+
+The policy is a callable that maps the game state to an action. If it
+has a reset method, reset(seed) is called before every episode, so
+stateful and random policies act the same for a seed in every run.
+It has to be importable by the workers, that is defined at the top
+level of a module.
+"""
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+import numpy as np
+from gym_bubbleshooter.envs import BubbleShooterEnv
+
+
+class RandomPolicy():
+    """
+    Shoots at random angles, drawn from a generator seeded
+    with the seed of the episode.
+    """
+
+    def __init__(self, seed=0):
+        self.reset(seed)
+
+    def reset(self, seed):
+        self.random_generator = np.random.Generator(np.random.PCG64(seed))
+
+    def __call__(self, state):
+        return int(self.random_generator.integers(179))
+
+
+def run_episode(env, policy, seed, max_steps=None):
+    """
+    Plays one episode of the given seed with the policy and returns its
+    summary: the seed, the return, the number of steps, the result
+    ("win", "lost" or "truncated" after max_steps), the number of
+    popped bubbles and the seconds it took.
+    """
+    start = time.perf_counter()
+    env.seed(seed)
+    state = env.reset()
+    if hasattr(policy, "reset"):
+        policy.reset(seed)
+    total, steps, pops, done = 0, 0, 0, False
+    while not done and (max_steps is None or steps < max_steps):
+        state, reward, done, info = env.step(policy(state))
+        pops += info["popped"]
+        total += reward
+        steps += 1
+    if done:
+        result = "lost" if (env.grid != env.empty).any() else "win"
+    else:
+        result = "truncated"
+    return {"seed": seed, "return": total, "length": steps, "result": result,
+            "pops": pops, "seconds": time.perf_counter() - start}
+
+
+# the environment and the policy of a worker process
+_worker_env = None
+_worker_policy = None
+_worker_max_steps = None
+
+
+def _init_worker(policy, env_kwargs, max_steps):
+    global _worker_env, _worker_policy, _worker_max_steps
+    _worker_env = BubbleShooterEnv(**env_kwargs)
+    _worker_policy = policy
+    _worker_max_steps = max_steps
+
+
+def _run_worker_episode(seed):
+    return run_episode(_worker_env, _worker_policy, seed, _worker_max_steps)
+
+
+def aggregate(episodes, seconds):
+    """
+    Returns the aggregate statistics of the given episode summaries,
+    that were played in the given number of seconds.
+    """
+    returns = np.array([episode["return"] for episode in episodes], dtype=np.float64)
+    lengths = np.array([episode["length"] for episode in episodes], dtype=np.float64)
+    pops = np.array([episode["pops"] for episode in episodes], dtype=np.float64)
+    results = [episode["result"] for episode in episodes]
+    count = len(episodes)
+    if count == 0:
+        return {"episodes": 0, "seconds": seconds}
+    return {"episodes": count,
+            "return_mean": returns.mean(),
+            "return_std": returns.std(),
+            "return_min": returns.min(),
+            "return_max": returns.max(),
+            "length_mean": lengths.mean(),
+            "pops_mean": pops.mean(),
+            "win_rate": results.count("win") / count,
+            "loss_rate": results.count("lost") / count,
+            "truncated": results.count("truncated"),
+            "seconds": seconds,
+            "episodes_per_sec": count / seconds,
+            "steps_per_sec": lengths.sum() / seconds}
+
+
+def evaluate(policy, seeds, workers=None, output=None, env_kwargs=None, max_steps=None,
+             context=None):
+    """
+    Plays one episode with the policy for every seed, spread over a pool
+    of worker processes, and returns the episode summaries in the order
+    of the seeds together with their aggregate statistics.
+
+    Parameters
+    ----------
+    policy : callable
+        Maps the game state to an action, see the module documentation.
+    seeds : list of int
+        The seeds of the episodes.
+    workers : int
+        The number of worker processes, all cores by default.
+        With one worker the episodes are played in this process.
+    output : str
+        A file the summary of every episode is appended to as a line
+        of JSON as soon as it is finished, followed by the aggregate
+        statistics.
+    env_kwargs : dict
+        The keyword arguments of every BubbleShooterEnv,
+        like the configuration of the board.
+    max_steps : int
+        The number of steps after which an episode is truncated.
+    context : str
+        The multiprocessing start method, the default if None.
+
+    Returns
+    -------
+    episodes, summary : tuple
+        The list of episode summaries, see run_episode,
+        and the aggregate statistics, see aggregate.
+    """
+    seeds = [int(seed) for seed in seeds]
+    env_kwargs = dict(env_kwargs or {})
+    workers = min(workers or os.cpu_count() or 1, max(1, len(seeds)))
+    results = open(output, "a") if output else None
+    episodes = []
+    pool = None
+    start = time.perf_counter()
+    try:
+        if workers == 1:
+            env = BubbleShooterEnv(**env_kwargs)
+            finished = (run_episode(env, policy, seed, max_steps) for seed in seeds)
+        else:
+            pool = multiprocessing.get_context(context).Pool(
+                workers, _init_worker, (policy, env_kwargs, max_steps))
+            finished = pool.imap_unordered(_run_worker_episode, seeds)
+        for episode in finished:
+            episodes.append(episode)
+            if results:
+                results.write(json.dumps(episode) + "\n")
+                results.flush()
+        if pool is not None:
+            pool.close()
+            pool.join()
+        summary = aggregate(episodes, time.perf_counter() - start)
+        if results:
+            results.write(json.dumps({"summary": summary}) + "\n")
+    finally:
+        if pool is not None:
+            pool.terminate()
+        if results:
+            results.close()
+    order = {seed: index for index, seed in enumerate(seeds)}
+    episodes.sort(key=lambda episode: order[episode["seed"]])
+    return episodes, summary
+
+
+def load_policy(name):
+    """
+    Returns the object of the given "package.module:attribute" name.
+    """
+    module, _, attribute = name.partition(":")
+    if not attribute:
+        raise ValueError("The policy has to be given as package.module:attribute")
+    policy = importlib.import_module(module)
+    for part in attribute.split("."):
+        policy = getattr(policy, part)
+    return policy
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Evaluates a policy on many episodes of the bubble shooter environment.")
+    parser.add_argument("--policy", default="gym_bubbleshooter.evaluation:RandomPolicy",
+                        help="package.module:attribute of the policy, a class is instantiated")
+    parser.add_argument("--episodes", type=int, default=100)
+    parser.add_argument("--first-seed", type=int, default=0,
+                        help="seed of the first episode, the others follow in order")
+    parser.add_argument("--seeds", type=int, nargs="+",
+                        help="the seeds of the episodes, instead of --episodes")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes, all cores by default")
+    parser.add_argument("--max-steps", type=int, default=None)
+    parser.add_argument("--output", help="file to append the episode summaries to as JSON lines")
+    parser.add_argument("--env-kwargs", type=json.loads, default={},
+                        help="keyword arguments of the environments as JSON")
+    args = parser.parse_args(argv)
+
+    policy = load_policy(args.policy)
+    if isinstance(policy, type):
+        policy = policy()
+    seeds = args.seeds or range(args.first_seed, args.first_seed + args.episodes)
+    _, summary = evaluate(policy, seeds, args.workers, args.output, args.env_kwargs,
+                          args.max_steps)
+    if summary["episodes"] == 0:
+        print("No episodes")
+        return 1
+    print("{episodes} episodes in {seconds:.1f} s, {episodes_per_sec:.1f} episodes/sec, "
+          "{steps_per_sec:.0f} steps/sec".format(**summary))
+    print("return {return_mean:.1f} +- {return_std:.1f} (min {return_min:.0f}, "
+          "max {return_max:.0f})".format(**summary))
+    print("length {length_mean:.1f}, pops {pops_mean:.1f}, wins {win_rate:.1%}, "
+          "losses {loss_rate:.1%}, truncated {truncated}".format(**summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,17 @@
-from setuptools import setup
+from setuptools import find_packages, setup
 
 setup(name='gym_bubbleshooter',
       version='0.0.1',
       description='OpenAI Gym environment for bubble shooter',
       author='Philip Ossenkopp',
       url="https://github.com/phossen/gym-bubbleshooter",
+      packages=find_packages(include=['gym_bubbleshooter', 'gym_bubbleshooter.*']),
       install_requires=['gym', 'numpy', 'pygame'],
-      python_requires='>=3.6'
+      python_requires='>=3.8',
+      entry_points={
+          'console_scripts': [
+              'bubbleshooter-benchmark=gym_bubbleshooter.benchmarks.throughput:main',
+              'bubbleshooter-eval=gym_bubbleshooter.evaluation:main',
+          ],
+      }
 )
@@ -0,0 +1,126 @@
+"""
+Parity of the local searches, the vectorized environment and the action
+classes with the full-board computations they replace.
+"""
+import numpy as np
+import pytest
+from gym_bubbleshooter.envs import BubbleShooterEnv, BubbleShooterVecEnv
+
+# (row, column) offsets of the neighbors in even and odd rows
+EVEN_OFFSETS = [(0, 1), (0, -1), (-1, 0), (-1, -1), (1, 0), (1, -1)]
+ODD_OFFSETS = [(0, 1), (0, -1), (-1, 0), (-1, 1), (1, 0), (1, 1)]
+
+
+def _anchored(grid, empty):
+    """
+    Returns the (row, column) of all bubbles connected to the top row,
+    by a flood from the top row over the whole board.
+    """
+    height, width = grid.shape
+    pending = [(0, column) for column in range(width) if grid[0, column] != empty]
+    anchored = set(pending)
+    while pending:
+        row, column = pending.pop()
+        for row_offset, column_offset in ODD_OFFSETS if row % 2 else EVEN_OFFSETS:
+            neighbor = (row + row_offset, column + column_offset)
+            if 0 <= neighbor[0] < height and 0 <= neighbor[1] < width \
+                    and grid[neighbor] != empty and neighbor not in anchored:
+                anchored.add(neighbor)
+                pending.append(neighbor)
+    return anchored
+
+
+def _bubbles(grid, empty):
+    return set(zip(*np.nonzero(grid != empty)))
+
+
+def _popping_action(env):
+    """
+    Returns an action that pops at least three bubbles, or None.
+    """
+    outcome = env.simulate_all_actions()
+    actions = np.flatnonzero(outcome["cluster_sizes"] >= 3)
+    return int(actions[0]) if len(actions) else None
+
+
+def test_board_write_is_deleted_as_floater():
+    for seed in range(20):
+        env = BubbleShooterEnv(seed=seed)
+        env.board[8][10].color = env.colors[3]
+        action = _popping_action(env)
+        if action is not None:
+            break
+    assert action is not None
+    predicted = env.simulate_all_actions([action])
+    _, _, _, info = env.step(action)
+    assert env.board[8][10].color is None
+    assert info["popped"] == predicted["cluster_sizes"][0] + predicted["floaters"][0]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_floaters_match_full_flood(seed):
+    env = BubbleShooterEnv(seed=seed)
+    random_generator = np.random.default_rng(seed)
+    for step in range(60):
+        if step % 10 == 5:
+            # write bubbles without a connection to the top through the board view
+            row = int(random_generator.integers(6, env.death_line))
+            env.board[row][int(random_generator.integers(env.array_width))].color = \
+                env.colors[int(random_generator.integers(len(env.colors)))]
+            env.board[0][int(random_generator.integers(env.array_width))].color = None
+        action = int(random_generator.integers(179))
+        predicted = env.simulate_all_actions([action])
+        _, _, done, info = env.step(action)
+        assert info["popped"] == (predicted["cluster_sizes"][0] + predicted["floaters"][0]
+                                  if predicted["cluster_sizes"][0] >= 3 else 0)
+        if info["popped"]:
+            assert _bubbles(env.grid, env.empty) == _anchored(env.grid, env.empty)
+        if done:
+            env.reset()
+
+
+def _sync(env, grid, next_color):
+    """
+    Sets the board and the next bubble of env to the given ones.
+    """
+    state = bytearray(env.get_state())
+    state[0] = next_color
+    state[-grid.size:] = grid.tobytes()
+    env.set_state(bytes(state))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_vec_env_matches_single_envs(seed):
+    num_envs = 8
+    vec_env = BubbleShooterVecEnv(num_envs=num_envs, seed=seed)
+    envs = [BubbleShooterEnv(seed=seed) for _ in range(num_envs)]
+    random_generator = np.random.default_rng(seed)
+    for _ in range(100):
+        for env, grid, next_color in zip(envs, vec_env.grids, vec_env.next_colors):
+            _sync(env, grid, next_color)
+        actions = random_generator.integers(0, 179, num_envs)
+        _, rewards, dones, info = vec_env.step(actions)
+        for index, (env, action) in enumerate(zip(envs, actions.tolist())):
+            _, reward, done, _ = env.step(action)
+            assert reward == rewards[index] and done == dones[index]
+            if done:
+                assert np.array_equal(env.grid.ravel(), info["terminal_board"][index])
+            else:
+                assert np.array_equal(env.grid, vec_env.grids[index])
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_action_classes_match_simulation(seed):
+    env = BubbleShooterEnv(seed=seed)
+    random_generator = np.random.default_rng(seed)
+    for _ in range(40):
+        classes = env.get_action_classes()
+        outcome = env.simulate_all_actions()
+        assert np.array_equal(classes["rows"], outcome["rows"])
+        assert np.array_equal(classes["columns"], outcome["columns"])
+        cells = outcome["rows"] * env.array_width + outcome["columns"]
+        canonical = classes["canonical"]
+        assert np.array_equal(cells[canonical], cells)
+        assert (canonical <= classes["actions"]).all()
+        if env.step(int(random_generator.integers(179)))[2]:
+            env.reset()
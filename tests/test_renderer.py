@@ -0,0 +1,21 @@
+"""
+The incremental frames of the rgb_array renderer against frames drawn
+from scratch.
+"""
+import numpy as np
+import pytest
+from gym_bubbleshooter.envs import BubbleShooterEnv
+from gym_bubbleshooter.envs.renderer import RgbArrayRenderer
+
+
+@pytest.mark.parametrize("scale", [1.0, 0.5, 0.2, 0.12, 0.1])
+def test_incremental_frames_match_fresh_frames(scale):
+    env = BubbleShooterEnv(seed=0, render_scale=scale)
+    random_generator = np.random.default_rng(0)
+    for _ in range(40):
+        frame = env.render(mode="rgb_array")
+        fresh = RgbArrayRenderer(env.geometry, env.colors, scale).render(
+            env.grid, env.color_dictionary[env.next_bubble.color])
+        assert np.array_equal(frame, fresh)
+        if env.step(int(random_generator.integers(179)))[2]:
+            env.reset()
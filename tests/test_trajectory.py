@@ -0,0 +1,96 @@
+"""
+Parity of the analytic trajectory against the original pixel by pixel
+stepping of the bubble, kept here as a copy of the old
+_move_next_bubble and _is_collided.
+
+The stop positions can differ by a fraction of a step at the top wall,
+so the landing cells are compared.
+"""
+import math
+import numpy as np
+import pytest
+from gym_bubbleshooter.envs import BubbleShooterEnv, trajectory
+
+
+def _move_next_bubble(env, x, y, angle):
+    """
+    Moves the bubble forward at the speed of env, like the old
+    BubbleShooterEnv._move_next_bubble.
+    """
+    if angle == 90:
+        xmove = 0
+        ymove = env.speed * -1
+    elif angle < 90:
+        xmove = math.cos(math.radians(angle)) * env.speed * -1
+        ymove = math.sin(math.radians(angle)) * env.speed * -1
+    else:
+        xmove = math.cos(math.radians(180 - angle)) * env.speed
+        ymove = math.sin(math.radians(180 - angle)) * env.speed * -1
+    x += xmove
+    y += ymove
+
+    # collision with left wall
+    if x - env.bubble_radius <= env.spacing:
+        angle = 180 - angle
+    # collision with right wall
+    elif x + env.bubble_radius >= env.window_width - env.spacing:
+        angle = 180 - angle
+    return x, y, angle
+
+
+def _is_collided(env, x, y, centers_x, centers_y):
+    """
+    Returns whether the bubble touches the top or one of the bubbles
+    given by their centers, like the old BubbleShooterEnv._is_collided.
+    """
+    if y - env.bubble_radius <= env.spacing:
+        return True
+    distances = np.sqrt((x - centers_x) ** 2 + (y - centers_y) ** 2) - env.bubble_radius * 2
+    return bool((distances < 0).any())
+
+
+def _old_landing_cell(env, action):
+    """
+    Returns the (row, column) the old stepping lands the next bubble in.
+    """
+    occupied = env.grid != env.empty
+    centers_x, centers_y = env.centers_x[occupied], env.centers_y[occupied]
+    x, y, angle = env.start_x, env.start_y, action + 1
+    while True:
+        x, y, angle = _move_next_bubble(env, x, y, angle)
+        if _is_collided(env, x, y, centers_x, centers_y):
+            break
+    # the old _set_next_bubble_position took the first closest empty cell
+    distances = np.sqrt((x - env.centers_x) ** 2 + (y - env.centers_y) ** 2)
+    distances[occupied] = np.inf
+    return divmod(int(np.argmin(distances)), env.array_width)
+
+
+def _new_landing_cell(env, action):
+    occupied = env.grid != env.empty
+    x, y = trajectory.cast(
+        env.start_x, env.start_y, action + 1,
+        env.centers_x[occupied], env.centers_y[occupied],
+        env.bubble_radius, env.spacing, env.window_width, env.speed)
+    return divmod(env._closest_empty(x, y), env.array_width)
+
+
+def _boards(seed, count, moves=7):
+    """
+    Yields environments whose boards were played with random actions.
+    """
+    env = BubbleShooterEnv(seed=seed)
+    random_generator = np.random.default_rng(seed)
+    for _ in range(count):
+        yield env
+        for _ in range(moves):
+            if env.step(int(random_generator.integers(179)))[2]:
+                env.reset()
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_landing_cells_match_old_stepping(seed):
+    for env in _boards(seed, 3):
+        for action in range(env.action_space.n):
+            assert _new_landing_cell(env, action) == _old_landing_cell(env, action), \
+                "seed {}, action {}".format(seed, action)